@@ -0,0 +1,24 @@
+#!/bin/sh
+# Mine a matured regtest chain into the image so that containers start with it
+set -e
+
+rpc() {
+    curl -s -u user:password --data-binary "{\"jsonrpc\": \"2.0\", \"method\": \"$1\", \"params\": $2}" -H 'content-type: text/plain;' http://localhost:18443
+}
+
+bitcoind -conf=/home/bitcoin/.bitcoin/bitcoin.conf -datadir=/home/bitcoin/data -daemon
+
+until rpc getblockcount '[]' | jq -e '.result != null' > /dev/null 2>&1
+do
+    sleep 0.5
+done
+
+rpc createwallet '{"wallet_name": "wallet", "load_on_startup": true}' > /dev/null
+ADDR=$(rpc getnewaddress '["wallet"]' | jq -r '.result')
+rpc generatetoaddress "[201, \"$ADDR\"]" > /dev/null
+
+rpc stop '[]' > /dev/null
+while pidof bitcoind > /dev/null
+do
+    sleep 0.5
+done
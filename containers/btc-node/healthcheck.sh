@@ -0,0 +1,6 @@
+#!/bin/sh
+
+# Healthy once the RPC server answers and the initial chain has matured
+BLOCK_COUNT=$(curl -s -u user:password --data-binary '{"jsonrpc": "2.0", "method": "getblockcount", "params": []}' -H 'content-type: text/plain;' http://localhost:18443 | jq ".result")
+
+[ "$BLOCK_COUNT" -gt 100 ] 2>/dev/null
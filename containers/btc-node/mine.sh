@@ -13,8 +13,8 @@ then
     curl -s -u user:password --data-binary "{\"jsonrpc\": \"2.0\", \"method\": \"generatetoaddress\", \"params\": [201, \"$ADDR\"]}" -H 'content-type: text/plain;' http://localhost:18443 > /dev/null
 fi
 
-# Mine new block periodically
-while true
+# Mine new block periodically unless mining is controlled by the manager
+while [ -z "$DISABLE_MINER" ]
 do
     sleep $(($RANDOM % 60 + 30))
     ADDR=$(curl -s -u user:password --data-binary '{"jsonrpc": "2.0", "method": "getnewaddress", "params": ["wallet"]}' -H 'content-type: text/plain;' http://localhost:18443 | jq -r '.result')
@@ -1,24 +1,63 @@
 from manager.btc_node import BtcNode
 from manager.wasabi_backend import WasabiBackend
 from manager.wasabi_clients import WasabiClient
+from manager.wasabi_clients.wasabi_client_base import WALLET_NAME
+from manager.scheduler import CoinjoinScheduler
+from manager.round_counter import RoundCounter
+from manager.block_notifier import BlockNotifier, HASHBLOCK_PORT, RAWTX_PORT
+from manager.mining import MiningPolicy, scale_timeouts
+from manager.distributor_pool import DistributorPool, BATCH_SIZE
+from manager.address_pool import AddressPool, WORKERS as ADDRESS_WORKERS
+from manager.startup import StartupScheduler, WINDOW as STARTUP_WINDOW
+from manager.rpc_metrics import PeriodicDump
+from manager.driver import TimedDriver
+from manager.driver.telemetry import ResourceSampler
+from manager.metrics import Histograms, MetricsServer
 from manager import utils
+from manager import timing
+from manager import rpc
 import manager.commands.genscen
+import manager.commands.bench
 from time import sleep, time
+import asyncio
 import sys
 import random
 import os
 import datetime
+import hashlib
 import json
 import argparse
+import collections
+import glob
 import shutil
 import tempfile
 import multiprocessing
 import multiprocessing.pool
+import queue
+import concurrent.futures
+import threading
 import math
 
 DISTRIBUTOR_UTXOS = 20
-BATCH_SIZE = 5
+DISTRIBUTOR_MAX_UTXOS = 500
+# outputs per funding transaction, well below the standard transaction weight
+FUNDING_OUTPUTS = 1000
+PACKED_WALLET_CPU = 0.05
+PACKED_WALLET_MEMORY = 256
+# directory of the daemon logs of packed client containers in the experiment data
+CONTAINER_LOGS = "containers"
 BTC = 100_000_000
+# readiness probes for drivers without image health checks, mirror the HEALTHCHECKs
+HEALTHCHECKS = {
+    "btc-node": ["/home/bitcoin/healthcheck.sh"],
+    "wasabi-backend": [
+        "sh",
+        "-c",
+        "curl -fs http://localhost:37127/api/v4/btc/Blockchain/status > /dev/null",
+    ],
+    "wasabi-client": ["bash", "-c", "exec 3<>/dev/tcp/127.0.0.1/37128"],
+}
+STARTUP_TIMEOUT = 300
 SCENARIO = {
     "name": "default",
     "rounds": 10,  # the number of coinjoins after which the simulation stops (0 for no limit)
@@ -38,16 +77,81 @@ args = None
 driver = None
 node = None
 coordinator = None
-distributor = None
+distributors = []
+distributor_pool = None
+resource_sampler = None
 clients = []
 versions = set()
 invoices = {}
+recipients = {}
+scheduler = CoinjoinScheduler()
+round_counter = None
+block_notifier = None
+miner = None
+thread_local = threading.local()
+driver_operations = Histograms()
+tick_durations = Histograms()
+metrics_server = None
 
 current_round = 0
 current_block = 0
+startup_latency = {}
+launched_clients = {}
+
+
+def create_driver(reuse_namespace=None):
+    if reuse_namespace is None:
+        reuse_namespace = getattr(args, "reuse_namespace", False)
+    backend = backend_driver(reuse_namespace)
+    return None if backend is None else TimedDriver(backend, driver_operations)
+
+
+def backend_driver(reuse_namespace):
+    match args.driver:
+        case "docker":
+            from manager.driver.docker import DockerDriver
+
+            return DockerDriver(args.namespace)
+        case "podman":
+            from manager.driver.podman import PodmanDriver
+
+            return PodmanDriver()
+        case "kubernetes":
+            from manager.driver.kubernetes import KubernetesDriver
+
+            return KubernetesDriver(
+                args.namespace,
+                reuse_namespace,
+                compress=getattr(args, "compress_transfers", False),
+                services=not getattr(args, "pod_addressing", False),
+            )
+        case "fake":
+            from manager.driver.fake import FakeDriver
+
+            return FakeDriver(
+                latency=getattr(args, "fake_latency", 0.0),
+                failure_rate=getattr(args, "fake_failure_rate", 0.0),
+                round_interval=getattr(args, "fake_round_interval", 10),
+                block_interval=getattr(args, "fake_block_interval", 10),
+            )
+    return None
+
+
+def direct_addressing():
+    # containers are reached at their own IPs, through the proxy or from in-cluster
+    return bool(args.proxy) or getattr(args, "pod_addressing", False)
+
+
+def thread_driver():
+    # the driver clients are not thread-safe, so worker threads get their own
+    if threading.current_thread() is threading.main_thread():
+        return driver
+    if not hasattr(thread_local, "driver"):
+        thread_local.driver = create_driver(reuse_namespace=True)
+    return thread_local.driver
 
 
-def prepare_image(name, path=None):
+def prepare_image(name, path=None, buildargs=None):
     prefixed_name = args.image_prefix + name
     if driver.has_image(prefixed_name):
         if args.force_rebuild:
@@ -55,7 +159,9 @@ def prepare_image(name, path=None):
                 driver.pull(prefixed_name)
                 print(f"- image pulled {prefixed_name}")
             else:
-                driver.build(name, f"./containers/{name}" if path is None else path)
+                driver.build(
+                    name, f"./containers/{name}" if path is None else path, buildargs
+                )
                 print(f"- image rebuilt {prefixed_name}")
         else:
             print(f"- image reused {prefixed_name}")
@@ -63,10 +169,30 @@ def prepare_image(name, path=None):
         driver.pull(prefixed_name)
         print(f"- image pulled {prefixed_name}")
     else:
-        driver.build(name, f"./containers/{name}" if path is None else path)
+        driver.build(name, f"./containers/{name}" if path is None else path, buildargs)
         print(f"- image built {prefixed_name}")
 
 
+def btc_node_snapshot_key():
+    # the snapshot image is built from the whole context, any change invalidates it
+    digest = hashlib.sha256()
+    context = "./containers/btc-node"
+    for root, dirs, files in os.walk(context):
+        dirs.sort()
+        for file in sorted(files):
+            path = os.path.join(root, file)
+            digest.update(os.path.relpath(path, context).encode() + b"\0")
+            with open(path, "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def btc_node_image():
+    if getattr(args, "btc_snapshot", False):
+        return f"btc-node:snapshot-{btc_node_snapshot_key()}"
+    return "btc-node"
+
+
 def prepare_client_images():
     for version in versions:
         major_version = version[0]
@@ -77,30 +203,78 @@ def prepare_client_images():
 
 def prepare_images():
     print("Preparing images")
-    prepare_image("btc-node")
+    if btc_node_image() == "btc-node":
+        prepare_image("btc-node")
+    else:
+        prepare_image(btc_node_image(), "./containers/btc-node", {"SNAPSHOT": "1"})
     prepare_image("wasabi-backend")
     prepare_client_images()
 
 
+def wait_healthy(name, client_driver=None, timeout=STARTUP_TIMEOUT):
+    # without a health state the application-level wait below decides alone
+    if (client_driver or driver).wait_healthy(name, timeout) is False:
+        raise Exception(f"{name} did not become healthy")
+
+
+def record_startup(name, start):
+    end = time()
+    timing.record(name, "startup", start, end)
+    startup_latency[name] = end - start
+    return startup_latency[name]
+
+
 def start_infrastructure():
     print("Starting infrastructure")
+    start = time()
     btc_node_ip, btc_node_ports = driver.run(
         "btc-node",
-        f"{args.image_prefix}btc-node",
-        ports={18443: 18443, 18444: 18444},
+        f"{args.image_prefix}{btc_node_image()}",
+        ports={
+            18443: 18443,
+            18444: 18444,
+            HASHBLOCK_PORT: HASHBLOCK_PORT,
+            RAWTX_PORT: RAWTX_PORT,
+        },
+        env={"DISABLE_MINER": "1"} if "time_compression" in SCENARIO else None,
         cpu=4.0,
         memory=8192,
+        healthcheck=HEALTHCHECKS["btc-node"],
     )
+    wait_healthy("btc-node")
     global node
     node = BtcNode(
-        host=btc_node_ip if args.proxy else args.control_ip,
-        port=18443 if args.proxy else btc_node_ports[18443],
+        host=btc_node_ip if direct_addressing() else args.control_ip,
+        port=18443 if direct_addressing() else btc_node_ports[18443],
         internal_ip=btc_node_ip,
         proxy=args.proxy,
     )
     node.wait_ready()
-    print("- started btc-node")
+    print(f"- started btc-node ({record_startup('btc-node', start):.1f} seconds)")
+
+    if args.zmq and not direct_addressing() and HASHBLOCK_PORT not in btc_node_ports:
+        print("- btc-node ZMQ ports are not exposed, falling back to block polling")
+    elif args.zmq:
+        notifier = BlockNotifier(
+            host=btc_node_ip if direct_addressing() else args.control_ip,
+            hashblock_port=(
+                HASHBLOCK_PORT
+                if direct_addressing()
+                else btc_node_ports[HASHBLOCK_PORT]
+            ),
+            rawtx_port=(
+                RAWTX_PORT if direct_addressing() else btc_node_ports.get(RAWTX_PORT)
+            ),
+            proxy=args.proxy,
+        )
+        if notifier.start():
+            global block_notifier
+            block_notifier = notifier
+            print("- subscribed to btc-node ZMQ notifications")
+        else:
+            print("- falling back to block polling")
 
+    start = time()
     wasabi_backend_ip, wasabi_backend_ports = driver.run(
         "wasabi-backend",
         f"{args.image_prefix}wasabi-backend",
@@ -111,11 +285,16 @@ def start_infrastructure():
         },
         cpu=8.0,
         memory=8192,
+        healthcheck=HEALTHCHECKS["wasabi-backend"],
     )
     sleep(1)
     with open("./containers/wasabi-backend/WabiSabiConfig.json", "r") as config_file:
         backend_config = json.load(config_file)
     backend_config.update(SCENARIO.get("backend", {}))
+    if "time_compression" in SCENARIO:
+        factor = SCENARIO["time_compression"].get("factor", 1)
+        backend_config = scale_timeouts(backend_config, factor)
+        print(f"- backend timeouts compressed {factor}x")
 
     with tempfile.NamedTemporaryFile(delete=False) as tmp_file:
         scenario_file = tmp_file.name
@@ -129,56 +308,107 @@ def start_infrastructure():
 
     global coordinator
     coordinator = WasabiBackend(
-        host=wasabi_backend_ip if args.proxy else args.control_ip,
-        port=37127 if args.proxy else wasabi_backend_ports[37127],
+        host=wasabi_backend_ip if direct_addressing() else args.control_ip,
+        port=37127 if direct_addressing() else wasabi_backend_ports[37127],
         internal_ip=wasabi_backend_ip,
         proxy=args.proxy,
     )
+    wait_healthy("wasabi-backend")
     coordinator.wait_ready()
-    print("- started wasabi-backend")
+    latency = record_startup("wasabi-backend", start)
+    print(f"- started wasabi-backend ({latency:.1f} seconds)")
+
+    global distributors
+    with multiprocessing.pool.ThreadPool() as pool:
+        distributors = pool.map(start_distributor, range(args.distributors))
+    print(f"- started {len(distributors)} distributor(s)")
 
+
+def start_distributor(idx):
+    name = "wasabi-client-distributor" + (f"-{idx:02}" if idx else "")
+    # additional distributors are mapped below the client port range
+    port = 37128 if idx == 0 else 36128 + idx
     distributor_version = SCENARIO.get(
         "distributor_version", SCENARIO["default_version"]
     )
+    start = time()
     wasabi_client_distributor_ip, wasabi_client_distributor_ports = driver.run(
-        "wasabi-client-distributor",
+        name,
         f"{args.image_prefix}wasabi-client:{distributor_version}",
         env={
             "ADDR_BTC_NODE": args.btc_node_ip or node.internal_ip,
             "ADDR_WASABI_BACKEND": args.wasabi_backend_ip or coordinator.internal_ip,
         },
-        ports={37128: 37128},
+        ports={37128: port},
         cpu=1.0,
         memory=2048,
+        healthcheck=HEALTHCHECKS["wasabi-client"],
     )
-    global distributor
+    wait_healthy(name)
     distributor = init_wasabi_client(
         distributor_version,
-        wasabi_client_distributor_ip if args.proxy else args.control_ip,
-        port=37128 if args.proxy else wasabi_client_distributor_ports[37128],
-        name="wasabi-client-distributor",
+        wasabi_client_distributor_ip if direct_addressing() else args.control_ip,
+        port=37128 if direct_addressing() else wasabi_client_distributor_ports[37128],
+        name=name,
         delay=(0, 0),
         stop=(0, 0),
     )
     if not distributor.wait_wallet(timeout=60):
-        print(f"- could not start distributor (application timeout)")
+        print(f"- could not start {name} (application timeout)")
         raise Exception("Could not start distributor")
-    print("- started distributor")
+    print(f"- started {name} ({record_startup(name, start):.1f} seconds)")
+    return distributor
 
 
-def fund_distributor(btc_amount):
-    print("Funding distributor")
-    for _ in range(DISTRIBUTOR_UTXOS):
-        node.fund_address(
-            distributor.get_new_address(),
-            math.ceil(btc_amount * BTC / DISTRIBUTOR_UTXOS) // BTC,
-        )
-    while (balance := distributor.get_balance()) < btc_amount * BTC:
-        sleep(1)
-    print(f"- funded (current balance {balance / BTC:.8f} BTC)")
+def distributor_utxos(wallets, distributor_count=1):
+    # enough coins for every payment batch to spend a confirmed one
+    invoice_count = sum(len(wallet.get("funds", [])) for wallet in wallets)
+    batches = math.ceil(invoice_count / BATCH_SIZE / distributor_count)
+    return min(max(DISTRIBUTOR_UTXOS, batches), DISTRIBUTOR_MAX_UTXOS)
 
 
-def init_wasabi_client(version, ip, port, name, delay, stop):
+def fund_distributors(btc_amount, utxos=DISTRIBUTOR_UTXOS, confirm=False):
+    print(f"Funding distributors ({len(distributors)} x {utxos} UTXOs)")
+    share = btc_amount / len(distributors)
+    amount = math.ceil(share * BTC / utxos) / BTC
+    with timing.span("funding addresses"), multiprocessing.pool.ThreadPool() as pool:
+        addresses = pool.map(
+            lambda distributor: distributor.get_new_addresses(utxos), distributors
+        )
+    outputs = [(address, amount) for batch in addresses for address in batch]
+    chunks = list(utils.batched(outputs, FUNDING_OUTPUTS))
+    with timing.span("sendmany"):
+        for idx, chunk in enumerate(chunks):
+            # later transactions may spend the change of earlier ones, confirm last
+            last = idx == len(chunks) - 1
+            txid = node.fund_addresses(dict(chunk), confirm and last)
+            if str(txid) == "timeout":
+                raise Exception("Distributor funding timed out")
+    if len(chunks) > 1:
+        print(f"- funded in {len(chunks)} transactions")
+    for distributor in distributors:
+        with timing.span(distributor.name, "funding"):
+            while (balance := distributor.get_balance()) < share * BTC:
+                sleep(1)
+        print(f"- funded {distributor.name} (current balance {balance / BTC:.8f} BTC)")
+
+    global distributor_pool
+    distributor_pool = DistributorPool(
+        distributors, BATCH_SIZE, on_paid=restart_recipients
+    ).start()
+
+
+def restart_recipients(batch):
+    # clients stop by themselves once all coins are mixed, paid ones got new coins
+    for address, _ in batch:
+        client = recipients.get(address)
+        if client is not None:
+            scheduler.forget(client)
+
+
+def init_wasabi_client(
+    version, ip, port, name, delay, stop, wallet_name=WALLET_NAME, container=None
+):
     return WasabiClient(version)(
         host=ip,
         port=port,
@@ -187,10 +417,12 @@ def init_wasabi_client(version, ip, port, name, delay, stop):
         version=version,
         delay=delay,
         stop=stop,
+        wallet_name=wallet_name,
+        container=container,
     )
 
 
-def start_client(idx, wallet):
+def client_config(idx, wallet):
     version = wallet.get("version", SCENARIO["default_version"])
 
     if "anon_score_target" in wallet:
@@ -215,87 +447,140 @@ def start_client(idx, wallet):
             f"Redcoin isolation is ignored for wallet {idx} as it is curently supported only for version 2.0.3 and newer"
         )
 
-    sleep(random.random() * 3)
-    name = f"wasabi-client-{idx:03}"
+    return version, anon_score_target, redcoin_isolation
+
+
+def pack_wallets(wallets, start=0):
+    # wallets sharing a daemon must share its version and configuration
+    per_container = SCENARIO.get("wallets_per_container", 1)
+    packs, open_packs = [], {}
+    for idx, wallet in enumerate(wallets, start=start):
+        config = client_config(idx, wallet)
+        if per_container <= 1 or config[0] < "2.0.4":
+            packs.append((config, [(idx, wallet)]))
+            continue
+        pack = open_packs.get(config)
+        if pack is None or len(pack) >= per_container:
+            pack = open_packs[config] = []
+            packs.append((config, pack))
+        pack.append((idx, wallet))
+    return packs
+
+
+def client_container(config, pack):
+    version, anon_score_target, redcoin_isolation = config
+    idx = pack[0][0]
+    extra_wallets = len(pack) - 1
+    if version < "2.0.4":
+        cpu, memory = 0.3, 1024
+    else:
+        cpu = 0.1 + PACKED_WALLET_CPU * extra_wallets
+        memory = 768 + PACKED_WALLET_MEMORY * extra_wallets
+
+    return dict(
+        name=f"wasabi-client-{idx:03}",
+        image=f"{args.image_prefix}wasabi-client:{version}",
+        env={
+            "ADDR_BTC_NODE": args.btc_node_ip or node.internal_ip,
+            "ADDR_WASABI_BACKEND": args.wasabi_backend_ip or coordinator.internal_ip,
+            "WASABI_ANON_SCORE_TARGET": (
+                str(anon_score_target) if anon_score_target else None
+            ),
+            "WASABI_REDCOIN_ISOLATION": (
+                str(redcoin_isolation) if redcoin_isolation else None
+            ),
+        },
+        ports={37128: 37129 + idx},
+        cpu=cpu,
+        memory=memory,
+        healthcheck=HEALTHCHECKS["wasabi-client"],
+    )
+
+
+def launch_clients(packs):
+    # containers created in bulk are only awaited by the first start attempt
+    containers = [client_container(*pack) for pack in packs]
+    start = time()
+    with timing.span("bulk create"):
+        results = driver.run_many(containers, args.startup_workers)
+    for container, result in zip(containers, results):
+        if isinstance(result, Exception):
+            print(f"- could not create {container['name']} ({result})")
+        else:
+            launched_clients[container["name"]] = (result, start)
+    print(f"- created {len(launched_clients)} client containers in bulk")
+
+
+def start_client(config, pack):
+    version = config[0]
+    extra_wallets = len(pack) - 1
+    container = client_container(config, pack)
+    name = container["name"]
+    start = time()
     try:
-        ip, manager_ports = driver.run(
-            name,
-            f"{args.image_prefix}wasabi-client:{version}",
-            env={
-                "ADDR_BTC_NODE": args.btc_node_ip or node.internal_ip,
-                "ADDR_WASABI_BACKEND": args.wasabi_backend_ip
-                or coordinator.internal_ip,
-                "WASABI_ANON_SCORE_TARGET": (
-                    str(anon_score_target) if anon_score_target else None
-                ),
-                "WASABI_REDCOIN_ISOLATION": (
-                    str(redcoin_isolation) if redcoin_isolation else None
-                ),
-            },
-            ports={37128: 37129 + idx},
-            cpu=(0.3 if version < "2.0.4" else 0.1),
-            memory=(1024 if version < "2.0.4" else 768),
-        )
+        if name in launched_clients:
+            (ip, manager_ports), start = launched_clients.pop(name)
+        else:
+            ip, manager_ports = driver.run(**container)
+        wait_healthy(name)
     except Exception as e:
         print(f"- could not start {name} ({e})")
         return None
 
-    delay = (wallet.get("delay_blocks", 0), wallet.get("delay_rounds", 0))
-    stop = (wallet.get("stop_blocks", 0), wallet.get("stop_rounds", 0))
-    client = init_wasabi_client(
-        version,
-        ip if args.proxy else args.control_ip,
-        37128 if args.proxy else manager_ports[37128],
-        f"wasabi-client-{idx:03}",
-        delay,
-        stop,
-    )
-
-    start = time()
-    if not client.wait_wallet(timeout=60):
-        print(
-            f"- could not start {name} (application timeout {time() - start} seconds)"
+    started = []
+    for wallet_idx, wallet in pack:
+        delay = (wallet.get("delay_blocks", 0), wallet.get("delay_rounds", 0))
+        stop = (wallet.get("stop_blocks", 0), wallet.get("stop_rounds", 0))
+        client = init_wasabi_client(
+            version,
+            ip if direct_addressing() else args.control_ip,
+            37128 if direct_addressing() else manager_ports[37128],
+            f"wasabi-client-{wallet_idx:03}",
+            delay,
+            stop,
+            wallet_name=f"wallet-{wallet_idx:03}" if extra_wallets else WALLET_NAME,
+            container=name,
         )
-        return None
-    print(f"- started {client.name} (wait took {time() - start} seconds)")
-    return client
+
+        if not client.wait_wallet(timeout=60):
+            print(
+                f"- could not start {client.name} "
+                f"(application timeout {time() - start} seconds)"
+            )
+            return None
+        latency = record_startup(client.name, start)
+        print(f"- started {client.name} ({latency:.1f} seconds)")
+        started.append((wallet_idx, client))
+    return started
 
 
 def start_clients(wallets):
     print("Starting clients")
-    with multiprocessing.pool.ThreadPool() as pool:
-        new_clients = pool.starmap(start_client, enumerate(wallets, start=len(clients)))
-
-        for _ in range(3):
-            restart_idx = list(
-                map(
-                    lambda x: x[0],
-                    filter(
-                        lambda x: x[1] is None,
-                        enumerate(new_clients, start=len(clients)),
-                    ),
-                )
-            )
+    packs = pack_wallets(wallets, start=len(clients))
+    if len(packs) < len(wallets):
+        print(f"- packing {len(wallets)} wallets into {len(packs)} containers")
+    if driver.bulk_run:
+        launch_clients(packs)
+    startup = StartupScheduler(
+        start_client,
+        cleanup=lambda config, pack: driver.stop(f"wasabi-client-{pack[0][0]:03}"),
+        window=args.startup_window,
+        adaptive=args.adaptive_startup,
+        retries=args.startup_retries,
+    )
+    started = startup.run(packs)
+    failed = sum(
+        len(pack) for (_, pack), result in zip(packs, started) if result is None
+    )
+    if failed:
+        print(f"- failed to start {failed} clients; continuing ...")
 
-            if not restart_idx:
-                break
-            print(f"- failed to start {len(restart_idx)} clients; retrying ...")
-            for idx in restart_idx:
-                driver.stop(f"wasabi-client-{idx:03}")
-            sleep(60)
-            restarted_clients = pool.starmap(
-                start_client,
-                ((idx, wallets[idx - len(clients)]) for idx in restart_idx),
-            )
-            for idx, client in enumerate(restarted_clients):
-                if client is not None:
-                    new_clients[restart_idx[idx]] = client
-        else:
-            new_clients = list(filter(lambda x: x is not None, new_clients))
-            print(
-                f"- failed to start {len(wallets) - len(new_clients)} clients; continuing ..."
-            )
-    clients.extend(new_clients)
+    new_clients = sorted(
+        (client for pack in started if pack is not None for client in pack),
+        key=lambda x: x[0],
+    )
+    clients.extend(client for _, client in new_clients)
+    print(f"- client startup: {startup.report(len(new_clients))}")
 
 
 def prepare_invoices(wallets):
@@ -304,8 +589,23 @@ def prepare_invoices(wallets):
         (client, wallet.get("funds", [])) for client, wallet in zip(clients, wallets)
     ]
 
+    address_pool = AddressPool(
+        workers=args.address_workers,
+        cache_path=(
+            f"./logs/{SCENARIO['name']}_addresses.json" if args.address_cache else None
+        ),
+    )
+    addresses = address_pool.generate(
+        [(client, len(funds)) for client, funds in client_invoices]
+    )
+    print(
+        f"- generated {address_pool.generated} addresses, reused {address_pool.cached} "
+        f"({address_pool.rate():.1f} addresses/s)"
+    )
+
     global invoices
     for client, funds in client_invoices:
+        client_addresses = iter(addresses.get(client.name, []))
         for fund in funds:
             block = 0
             round = 0
@@ -315,7 +615,8 @@ def prepare_invoices(wallets):
                 value = fund.get("value", 0)
                 block = fund.get("delay_blocks", 0)
                 round = fund.get("delay_rounds", 0)
-            addressed_invoice = (client.get_new_address(), value)
+            addressed_invoice = (next(client_addresses), value)
+            recipients[addressed_invoice[0]] = client
             if (block, round) not in invoices:
                 invoices[(block, round)] = [addressed_invoice]
             else:
@@ -331,67 +632,68 @@ def pay_invoices(addressed_invoices):
     print(
         f"- paying {len(addressed_invoices)} invoices (batch size {BATCH_SIZE}, block {current_block}, round {current_round})"
     )
-    try:
-        for batch in utils.batched(addressed_invoices, BATCH_SIZE):
-            for _ in range(3):
-                try:
-                    result = distributor.send(batch)
-                    if str(result) == "timeout":
-                        print("- transaction timeout")
-                        continue
-                    break
-                except Exception as e:
-                    # https://github.com/zkSNACKs/WalletWasabi/issues/12764
-                    if "Bad Request" in str(e):
-                        print("- transaction error (bad request)")
-                    else:
-                        print(f"- transaction error ({e})")
-            else:
-                print("- invoice payment failed")
-                raise Exception("Invoice payment failed")
-
-    except Exception as e:
-        print("- invoice payment failed")
-        raise e
+    distributor_pool.submit(addressed_invoices)
 
 
 def start_coinjoin(client):
     sleep(random.random() / 10)
-    client.start_coinjoin()
+    scheduler.forget(client)
+    scheduler.record(client, True, client.start_coinjoin())
 
 
 def stop_coinjoin(client):
     sleep(random.random() / 10)
-    client.stop_coinjoin()
+    scheduler.forget(client)
+    scheduler.record(client, False, client.stop_coinjoin())
+
+
+async def start_coinjoin_async(client):
+    await asyncio.sleep(random.random() / 10)
+    scheduler.forget(client)
+    scheduler.record(client, True, await client.start_coinjoin_async())
+
+
+async def stop_coinjoin_async(client):
+    await asyncio.sleep(random.random() / 10)
+    scheduler.forget(client)
+    scheduler.record(client, False, await client.stop_coinjoin_async())
+
+
+def start_condition(client):
+    if client.stop[0] > 0 and current_block >= client.stop[0]:
+        return False
+    if client.stop[1] > 0 and current_round >= client.stop[1]:
+        return False
+    if current_block < client.delay[0]:
+        return False
+    if current_round < client.delay[1]:
+        return False
+    return True
 
 
 def update_coinjoins():
-    def start_condition(client):
-        if client.stop[0] > 0 and current_block >= client.stop[0]:
-            return False
-        if client.stop[1] > 0 and current_round >= client.stop[1]:
-            return False
-        if current_block < client.delay[0]:
-            return False
-        if current_round < client.delay[1]:
-            return False
-        return True
-
-    start, stop = [], []
-    for client in clients:
-        if start_condition(client):
-            start.append(client)
-        else:
-            stop.append(client)
+    start, stop = scheduler.plan(clients, start_condition)
 
-    with multiprocessing.pool.ThreadPool() as pool:
-        pool.starmap(start_coinjoin, ((client,) for client in start))
+    if start:
+        with multiprocessing.pool.ThreadPool() as pool:
+            pool.starmap(start_coinjoin, ((client,) for client in start))
+
+    if stop:
+        with multiprocessing.pool.ThreadPool() as pool:
+            pool.starmap(stop_coinjoin, ((client,) for client in stop))
 
-    with multiprocessing.pool.ThreadPool() as pool:
-        pool.starmap(stop_coinjoin, ((client,) for client in stop))
+
+async def update_coinjoins_async():
+    start, stop = scheduler.plan(clients, start_condition)
+    await asyncio.gather(
+        *(start_coinjoin_async(client) for client in start),
+        *(stop_coinjoin_async(client) for client in stop),
+    )
 
 
 def update_invoice_payments():
+    # payments run in the background, surface their failure in the run loop
+    distributor_pool.check()
     due = list(
         filter(
             lambda x: x[0] <= current_block and x[1] <= current_round, invoices.keys()
@@ -408,31 +710,197 @@ def stop_coinjoins():
         print(f"- stopped mixing {client.name}")
 
 
-def store_client_logs(client, data_path):
-    sleep(random.random() * 3)
-    client_path = os.path.join(data_path, client.name)
+def directory_size(path):
+    return sum(
+        os.path.getsize(os.path.join(root, file))
+        for root, _, files in os.walk(path)
+        for file in files
+    )
+
+
+def store_client_logs(client, client_path, client_driver, download=True):
     os.mkdir(client_path)
     with open(os.path.join(client_path, "coins.json"), "w") as f:
         json.dump(client.list_coins(), f, indent=2)
-        print(f"- stored {client.name} coins")
     with open(os.path.join(client_path, "unspent_coins.json"), "w") as f:
         json.dump(client.list_unspent_coins(), f, indent=2)
-        print(f"- stored {client.name} unspent coins")
     with open(os.path.join(client_path, "keys.json"), "w") as f:
         json.dump(client.list_keys(), f, indent=2)
-        print(f"- stored {client.name} keys")
+    if not download:
+        # the daemon logs of packed wallets are stored once, next to the clients
+        with open(os.path.join(client_path, "container.json"), "w") as f:
+            json.dump(
+                {
+                    "container": client.container,
+                    "logs": f"../{CONTAINER_LOGS}/{client.container}",
+                },
+                f,
+                indent=2,
+            )
+        return directory_size(client_path), True
     try:
-        driver.download(client.name, "/home/wasabi/.walletwasabi/client/", client_path)
-
-        print(f"- stored {client.name} logs")
+        client_driver.download(
+            client.container, "/home/wasabi/.walletwasabi/client/", client_path
+        )
+        logs = True
     except:
-        print(f"- could not store {client.name} logs")
+        logs = False
+    return directory_size(client_path), logs
+
+
+def store_container_logs(container, container_path, client_driver):
+    os.makedirs(container_path)
+    client_driver.download(
+        container, "/home/wasabi/.walletwasabi/client/", container_path
+    )
+    return directory_size(container_path), True
+
+
+def store_clients_logs(data_path):
+    # logs are stored into a staging directory and moved into place when done,
+    # so a worker abandoned after a timeout never writes into the archived tree
+    staging_path = f"{os.path.dirname(data_path)}.partial"
+    os.makedirs(staging_path)
+    tasks, results = queue.Queue(), queue.Queue()
+    started, finished, abandoned = {}, set(), set()
+    # the staging directory is removed by whoever stops last, the main thread
+    # or the last abandoned worker, never under a running download
+    running, stop, lock = set(), threading.Event(), threading.Lock()
+
+    def release(name):
+        with lock:
+            running.discard(name)
+            if stop.is_set() and not running:
+                shutil.rmtree(staging_path, ignore_errors=True)
+
+    # wallets packed into one daemon share its logs, download them once
+    wallets = collections.Counter(client.container for client in clients)
+    for container, count in wallets.items():
+        if count > 1:
+            tasks.put(
+                (
+                    os.path.join(CONTAINER_LOGS, container),
+                    lambda path, container=container: store_container_logs(
+                        container, path, thread_driver()
+                    ),
+                )
+            )
+    for client in clients:
+        tasks.put(
+            (
+                client.name,
+                lambda path, client=client: store_client_logs(
+                    client, path, thread_driver(), wallets[client.container] == 1
+                ),
+            )
+        )
+    total = tasks.qsize()
+
+    def work():
+        while True:
+            with lock:
+                if stop.is_set():
+                    return
+                try:
+                    name, store = tasks.get_nowait()
+                except queue.Empty:
+                    return
+                running.add(name)
+            started[name] = time()
+            try:
+                with timing.span(name, "logs"):
+                    result = store(os.path.join(staging_path, name))
+                results.put((name, result, None))
+            except Exception as e:
+                results.put((name, None, e))
+            if name in abandoned:
+                shutil.rmtree(os.path.join(staging_path, name), ignore_errors=True)
+            release(name)
+
+    # daemon threads, the interpreter does not wait for abandoned ones at exit
+    for idx in range(min(args.log_workers, len(clients))):
+        threading.Thread(target=work, name=f"logs-{idx}", daemon=True).start()
+
+    start = time()
+    stored, failed, timed_out, stored_bytes = 0, 0, 0, 0
+    while len(finished) + len(abandoned) < total:
+        try:
+            name, result, error = results.get(timeout=1)
+        except queue.Empty:
+            name = None
+        if name is not None and name not in abandoned:
+            finished.add(name)
+            path = os.path.join(staging_path, name)
+            target = os.path.join(data_path, name)
+            if os.path.exists(path):
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.rename(path, target)
+            progress = f"{stored + failed + timed_out + 1}/{total}"
+            if error is not None:
+                failed += 1
+                print(f"- could not store {name} ({error}) ({progress})")
+            else:
+                size, logs = result
+                stored_bytes += size
+                stored += 1
+                if logs:
+                    print(f"- stored {name} ({progress})")
+                else:
+                    print(f"- stored {name} without logs ({progress})")
+        now = time()
+        for name, since in list(started.items()):
+            if name in finished or name in abandoned:
+                continue
+            if now - since > args.log_timeout:
+                # the worker cannot be interrupted, leave it out of the archive
+                abandoned.add(name)
+                timed_out += 1
+                progress = f"{stored + failed + timed_out}/{total}"
+                print(f"- could not store {name} (timeout) ({progress})")
+    stop.set()
+    release(None)
+
+    elapsed = max(time() - start, 1e-6)
+    print(
+        f"- stored {stored}/{total} clients and containers in {elapsed:.1f} seconds "
+        f"({stored / elapsed:.2f} per second, "
+        f"{stored_bytes / elapsed / 2**20:.2f} MiB/s, "
+        f"{failed} failed, {timed_out} timed out)"
+    )
+
+
+def store_block_chunk(node_path, heights):
+    block_hashes = node.get_block_hashes(heights)
+    if block_hashes == "timeout":
+        raise Exception(f"block hash export timeout at height {heights[0]}")
+    blocks = node.get_block_infos(block_hashes)
+    if blocks == "timeout":
+        raise Exception(f"block export timeout at height {heights[0]}")
+    for height, block in zip(heights, blocks):
+        with open(os.path.join(node_path, f"block_{height}.json"), "w") as f:
+            json.dump(block, f, indent=2)
+    return len(blocks)
+
+
+def store_blocks(node_path):
+    block_count = node.get_block_count()
+    chunks = list(utils.batched(range(block_count), args.block_export_chunk))
+    with multiprocessing.pool.ThreadPool(args.block_export_workers) as pool:
+        return sum(
+            pool.imap_unordered(
+                lambda heights: store_block_chunk(node_path, heights), chunks
+            )
+        )
 
 
 def store_logs():
     print("Storing logs")
     time = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M")
     experiment_path = f"./logs/{time}_{SCENARIO['name']}"
+    # staging directories left by an earlier run that exited while abandoned
+    # log workers were still downloading
+    for path in glob.glob("./logs/*.partial"):
+        shutil.rmtree(path, ignore_errors=True)
     data_path = os.path.join(experiment_path, "data")
     os.makedirs(data_path)
 
@@ -440,82 +908,316 @@ def store_logs():
         json.dump(SCENARIO, f, indent=2)
         print("- stored scenario")
 
-    stored_blocks = 0
+    with open(os.path.join(experiment_path, "startup.json"), "w") as f:
+        json.dump(startup_latency, f, indent=2)
+        print("- stored startup latency")
+
     node_path = os.path.join(data_path, "btc-node")
     os.mkdir(node_path)
-    while stored_blocks < node.get_block_count():
-        block_hash = node.get_block_hash(stored_blocks)
-        block = node.get_block_info(block_hash)
-        with open(os.path.join(node_path, f"block_{stored_blocks}.json"), "w") as f:
-            json.dump(block, f, indent=2)
-        stored_blocks += 1
-    print(f"- stored {stored_blocks} blocks")
+    try:
+        with timing.span("blocks"):
+            stored_blocks = store_blocks(node_path)
+        print(f"- stored {stored_blocks} blocks")
+    except Exception as e:
+        print(f"- could not store blocks ({e})")
 
     try:
-        driver.download(
-            "wasabi-backend",
-            "/home/wasabi/.walletwasabi/backend/",
-            os.path.join(data_path, "wasabi-backend"),
-        )
+        with timing.span("wasabi-backend", "logs"):
+            driver.download(
+                "wasabi-backend",
+                "/home/wasabi/.walletwasabi/backend/",
+                os.path.join(data_path, "wasabi-backend"),
+            )
 
         print(f"- stored backend logs")
     except:
         print(f"- could not store backend logs")
 
-    # TODO parallelize (driver cannot be simply passed to new threads)
-    for client in clients:
-        store_client_logs(client, data_path)
+    store_clients_logs(data_path)
+
+    if resource_sampler is not None and os.path.exists(resource_sampler.path):
+        shutil.move(
+            resource_sampler.path, os.path.join(experiment_path, "resources.csv")
+        )
+        print(f"- stored {resource_sampler.samples} resource samples")
+
+    if rpc.metrics.enabled:
+        rpc.metrics.dump(os.path.join(experiment_path, "rpc.json"))
+        print("- stored RPC metrics")
+    return experiment_path
+
 
+def store_timings(experiment_path):
+    # dumped once all phases are closed, also when the logs are not stored
+    if experiment_path is None:
+        path = f"./logs/{SCENARIO['name']}_timings.json"
+    else:
+        path = os.path.join(experiment_path, "timings.json")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    timing.dump(path)
+    print("- stored timings")
+
+
+def archive_logs(experiment_path):
     shutil.make_archive(experiment_path, "zip", *os.path.split(experiment_path))
     print("- zip archive created")
 
 
-def run():
+def update_round():
+    global current_round, round_counter
+    if round_counter is None:
+        # the follower stays bound to the driver of the thread creating it
+        round_counter = RoundCounter(thread_driver())
+    for _ in range(3):
+        try:
+            current_round = round_counter.update()
+            break
+        except Exception as e:
+            print(f"- could not get rounds".ljust(60), end="\r")
+            print(f"Round exception: {e}", file=sys.stderr)
+
+
+def update_mining():
+    try:
+        if miner.update(current_round):
+            print(f"- mined block {miner.mined}".ljust(80))
+    except Exception as e:
+        print(f"- could not mine block".ljust(60), end="\r")
+        print(f"Mining exception: {e}", file=sys.stderr)
+
+
+def update_block(initial_block):
+    global current_block
+    for _ in range(3):
+        try:
+            block_count = node.get_block_count()
+            current_block = block_count - initial_block
+            if block_notifier is not None and block_notifier.alive:
+                block_notifier.cross_check(block_count)
+            break
+        except Exception as e:
+            print(f"- could not get blocks".ljust(60), end="\r")
+            print(f"Block exception: {e}", file=sys.stderr)
+
+
+def simulation_running():
+    return (SCENARIO["rounds"] == 0 or current_round < SCENARIO["rounds"]) and (
+        SCENARIO["blocks"] == 0 or current_block < SCENARIO["blocks"]
+    )
+
+
+def print_status():
+    status = f"- coinjoin rounds: {current_round} (block {current_block})"
+    rpcs = f"{scheduler.last_sent} RPCs sent, {scheduler.last_skipped} skipped"
+    if distributor_pool is not None and distributor_pool.pending():
+        rpcs += f", {distributor_pool.pending()} invoices pending"
+    print(f"{status} [{rpcs}]".ljust(80), end="\r")
+
+
+def blocks_polled():
+    return block_notifier is None or not block_notifier.alive or block_notifier.stale
+
+
+def update_block_if_needed(initial_block):
+    if blocks_polled() or block_notifier.take():
+        update_block(initial_block)
+
+
+def wait_tick(timeout=1):
+    if blocks_polled():
+        sleep(timeout)
+    else:
+        block_notifier.wait(timeout)
+
+
+def run_simulation():
+    initial_block = node.get_block_count()
+    while simulation_running():
+        start = time()
+        update_round()
+        if miner is not None:
+            update_mining()
+        update_block_if_needed(initial_block)
+        update_invoice_payments()
+        update_coinjoins()
+        print_status()
+        tick_durations.observe("tick", time() - start)
+        wait_tick()
+
+
+async def run_simulation_async():
+    loop = asyncio.get_running_loop()
+    # rounds are always counted on one thread, which owns the follower's driver
+    rounds = concurrent.futures.ThreadPoolExecutor(1, thread_name_prefix="rounds")
+    try:
+        await simulation_loop_async(loop, rounds)
+    finally:
+        rounds.shutdown()
+
+
+async def simulation_loop_async(loop, rounds):
+    initial_block = await rpc.run_async(node.get_block_count)
+    while simulation_running():
+        start = time()
+        await asyncio.gather(
+            loop.run_in_executor(rounds, update_round),
+            rpc.run_async(update_block_if_needed, initial_block),
+        )
+        if miner is not None:
+            await rpc.run_async(update_mining)
+        await rpc.run_async(update_invoice_payments)
+        await update_coinjoins_async()
+        print_status()
+        tick_durations.observe("tick", time() - start)
+        await rpc.run_async(wait_tick, max(0, 1 - (time() - start)))
+
+
+def collect_metrics(exposition):
+    exposition.family(
+        "coinjoin_current_round",
+        "gauge",
+        "Coinjoin rounds completed since the start of the simulation.",
+        [({}, current_round)],
+    )
+    exposition.family(
+        "coinjoin_current_block",
+        "gauge",
+        "Blocks mined since the start of the simulation.",
+        [({}, current_block)],
+    )
+    states = {"mixing": 0, "stopped": 0, "unknown": 0}
+    for client in list(clients):
+        mixing = scheduler.is_mixing(client)
+        states["unknown" if mixing is None else "mixing" if mixing else "stopped"] += 1
+    exposition.family(
+        "coinjoin_clients",
+        "gauge",
+        "Started clients by their last acknowledged coinjoin state.",
+        [({"state": state}, count) for state, count in states.items()],
+    )
+    exposition.family(
+        "coinjoin_pending_invoices",
+        "gauge",
+        "Invoices not due yet (scheduled) and waiting for a distributor (queued).",
+        [
+            ({"stage": "scheduled"}, sum(map(len, list(invoices.values())))),
+            (
+                {"stage": "queued"},
+                distributor_pool.pending() if distributor_pool is not None else 0,
+            ),
+        ],
+    )
+    exposition.family(
+        "coinjoin_invoices_paid_total",
+        "counter",
+        "Invoices paid by the distributors.",
+        [
+            (
+                {},
+                (
+                    sum(stats.invoices for stats in distributor_pool.stats)
+                    if distributor_pool is not None
+                    else 0
+                ),
+            )
+        ],
+    )
+    methods = sorted(rpc.metrics.methods().items())
+    exposition.family(
+        "coinjoin_rpc_requests_total",
+        "counter",
+        "RPCs sent by the manager, including timed out ones.",
+        [({"method": m}, s.latency.count + s.timeouts) for m, s in methods],
+    )
+    exposition.family(
+        "coinjoin_rpc_timeouts_total",
+        "counter",
+        "RPCs that timed out.",
+        [({"method": m}, s.timeouts) for m, s in methods],
+    )
+    exposition.family(
+        "coinjoin_rpc_errors_total",
+        "counter",
+        "RPCs that failed or returned an error.",
+        [({"method": m}, s.errors) for m, s in methods],
+    )
+    exposition.histogram(
+        "coinjoin_rpc_duration_seconds",
+        "Latency of RPCs that did not time out.",
+        {m: s.latency for m, s in methods},
+        "method",
+    )
+    exposition.histogram(
+        "coinjoin_tick_duration_seconds",
+        "Duration of simulation loop ticks, excluding the wait for the next tick.",
+        tick_durations.snapshot(),
+        None,
+    )
+    exposition.histogram(
+        "coinjoin_driver_operation_duration_seconds",
+        "Duration of container driver operations.",
+        driver_operations.snapshot(),
+        "operation",
+    )
 
+
+def run():
+    metrics_dump = None
+    experiment_path = None
     try:
         print(f"=== Scenario {SCENARIO['name']} ===")
-        prepare_images()
-        start_infrastructure()
-        fund_distributor(1000)
-        start_clients(SCENARIO["wallets"])
-        prepare_invoices(SCENARIO["wallets"])
+        if args.metrics_port:
+            global metrics_server
+            metrics_server = MetricsServer(
+                collect_metrics, args.metrics_host, args.metrics_port
+            ).start()
+            print(
+                f"- serving metrics on "
+                f"http://{metrics_server.host}:{metrics_server.port}/metrics"
+            )
+        if args.rpc_metrics_interval and rpc.metrics.enabled:
+            metrics_dump = PeriodicDump(
+                rpc.metrics,
+                f"./logs/{SCENARIO['name']}_rpc.json",
+                args.rpc_metrics_interval,
+            ).start()
+        with timing.phase("prepare_images"):
+            prepare_images()
+        if args.resource_interval and not driver.supports_sampling:
+            print(f"- container resources are not sampled by the {args.driver} driver")
+        elif args.resource_interval:
+            global resource_sampler
+            resource_sampler = ResourceSampler(
+                lambda: thread_driver().sample(),
+                f"./logs/{SCENARIO['name']}_resources.csv",
+                args.resource_interval,
+            ).start()
+        with timing.phase("start_infrastructure"):
+            start_infrastructure()
+        with timing.phase("fund_distributors"):
+            fund_distributors(
+                1000,
+                distributor_utxos(SCENARIO["wallets"], len(distributors)),
+                args.confirm_funding or "time_compression" in SCENARIO,
+            )
+        with timing.phase("start_clients"):
+            start_clients(SCENARIO["wallets"])
+        with timing.phase("prepare_invoices"):
+            prepare_invoices(SCENARIO["wallets"])
 
         print("Running simulation")
-        global current_round
-        global current_block
-        initial_block = node.get_block_count()
-        while (SCENARIO["rounds"] == 0 or current_round < SCENARIO["rounds"]) and (
-            SCENARIO["blocks"] == 0 or current_block < SCENARIO["blocks"]
-        ):
-            for _ in range(3):
-                try:
-                    current_round = sum(
-                        1
-                        for _ in driver.peek(
-                            "wasabi-backend",
-                            "/home/wasabi/.walletwasabi/backend/WabiSabi/CoinJoinIdStore.txt",
-                        ).split("\n")[:-1]
-                    )
-                    break
-                except Exception as e:
-                    print(f"- could not get rounds".ljust(60), end="\r")
-                    print(f"Round exception: {e}", file=sys.stderr)
-
-            for _ in range(3):
-                try:
-                    current_block = node.get_block_count() - initial_block
-                    break
-                except Exception as e:
-                    print(f"- could not get blocks".ljust(60), end="\r")
-                    print(f"Block exception: {e}", file=sys.stderr)
-
-            update_invoice_payments()
-            update_coinjoins()
-            print(
-                f"- coinjoin rounds: {current_round} (block {current_block})".ljust(60),
-                end="\r",
+        if "time_compression" in SCENARIO:
+            global miner
+            compression = SCENARIO["time_compression"]
+            miner = MiningPolicy.from_scenario(
+                node, compression.get("mining", {}), compression.get("factor", 1)
             )
-            sleep(1)
+            print(f"- manager-controlled mining ({miner.policy})")
+        with timing.phase("simulation"):
+            if args.async_loop:
+                asyncio.run(run_simulation_async())
+            else:
+                run_simulation()
         print()
         print(f"- limit reached")
     except KeyboardInterrupt:
@@ -524,9 +1226,52 @@ def run():
     except Exception as e:
         print(f"Terminating exception: {e}", file=sys.stderr)
     finally:
-        stop_coinjoins()
+        if round_counter is not None:
+            round_counter.close()
+        if block_notifier is not None:
+            block_notifier.stop()
+        print(f"- coinjoin scheduler {scheduler.summary()}")
+        if distributor_pool is not None:
+            distributor_pool.stop()
+            for line in distributor_pool.summary():
+                print(f"- {line}")
+        with timing.phase("stop_coinjoins"):
+            stop_coinjoins()
+        if resource_sampler is not None:
+            resource_sampler.stop()
+            if resource_sampler.peaks:
+                print("Container resources")
+                for line in resource_sampler.summary():
+                    print(f"- {line}")
         if not args.no_logs:
-            store_logs()
+            with timing.phase("store_logs"):
+                experiment_path = store_logs()
+        if args.fake_stats and args.driver == "fake":
+            with open(args.fake_stats, "w") as f:
+                json.dump(
+                    {
+                        "wallets": len(SCENARIO["wallets"]),
+                        "clients": len(clients),
+                        "phases": timing.phases(),
+                        **driver.stats(),
+                    },
+                    f,
+                    indent=2,
+                )
+        print("Timings")
+        for line in timing.summary():
+            print(f"- {line}")
+        store_timings(experiment_path)
+        if experiment_path is not None:
+            archive_logs(experiment_path)
+        if metrics_dump is not None:
+            metrics_dump.stop()
+        if rpc.metrics.enabled:
+            print("RPC metrics")
+            for line in rpc.metrics.report():
+                print(f"- {line}")
+        if metrics_server is not None:
+            metrics_server.stop()
         driver.cleanup(args.image_prefix)
 
 
@@ -537,7 +1282,7 @@ if __name__ == "__main__":
     parser.add_argument(
         "--driver",
         type=str,
-        choices=["docker", "podman", "kubernetes"],
+        choices=["docker", "podman", "kubernetes", "fake"],
         default="docker",
     )
     parser.add_argument("--no-logs", action="store_true", default=False)
@@ -550,6 +1295,12 @@ if __name__ == "__main__":
     build_subparser.add_argument(
         "--image-prefix", type=str, default="", help="image prefix"
     )
+    build_subparser.add_argument(
+        "--btc-snapshot",
+        action="store_true",
+        default=False,
+        help="build btc-node image with a pre-mined chain",
+    )
 
     run_subparser = subparsers.add_parser("run", help="run simulation")
     run_subparser.add_argument(
@@ -561,6 +1312,12 @@ if __name__ == "__main__":
     run_subparser.add_argument(
         "--scenario", type=str, help="scenario specification file"
     )
+    run_subparser.add_argument(
+        "--btc-snapshot",
+        action="store_true",
+        default=False,
+        help="start btc-node from an image with a pre-mined chain",
+    )
     run_subparser.add_argument(
         "--btc-node-ip", type=str, help="override btc-node ip", default=""
     )
@@ -576,6 +1333,180 @@ if __name__ == "__main__":
     run_subparser.add_argument("--proxy", type=str, default="")
     run_subparser.add_argument("--namespace", type=str, default="coinjoin")
     run_subparser.add_argument("--reuse-namespace", action="store_true", default=False)
+    run_subparser.add_argument(
+        "--block-export-chunk",
+        type=int,
+        default=100,
+        help="number of blocks fetched per batch request when storing logs",
+    )
+    run_subparser.add_argument(
+        "--block-export-workers",
+        type=int,
+        default=4,
+        help="maximum number of block batches in flight when storing logs",
+    )
+    run_subparser.add_argument(
+        "--async-loop",
+        action="store_true",
+        default=False,
+        help="run the simulation loop on asyncio",
+    )
+    run_subparser.add_argument(
+        "--concurrency",
+        type=int,
+        default=rpc.ASYNC_CONCURRENCY,
+        help="maximum number of concurrent RPC calls in the asyncio loop",
+    )
+    run_subparser.add_argument(
+        "--zmq",
+        action="store_true",
+        default=False,
+        help="track blocks via btc-node ZMQ notifications instead of polling",
+    )
+    run_subparser.add_argument(
+        "--reconcile-interval",
+        type=int,
+        default=60,
+        help="re-send the coinjoin state to every client each N ticks (0 to disable)",
+    )
+    run_subparser.add_argument(
+        "--compress-transfers",
+        action="store_true",
+        default=False,
+        help="gzip log downloads over the Kubernetes exec channel",
+    )
+    run_subparser.add_argument(
+        "--log-workers",
+        type=int,
+        default=8,
+        help="number of clients whose logs are collected in parallel",
+    )
+    run_subparser.add_argument(
+        "--log-timeout",
+        type=int,
+        default=300,
+        help="seconds after which log collection of a single client is abandoned",
+    )
+    run_subparser.add_argument(
+        "--rpc-pool-size",
+        type=int,
+        default=rpc.POOL_MAXSIZE,
+        help="maximum number of pooled connections per RPC endpoint",
+    )
+    run_subparser.add_argument(
+        "--pod-addressing",
+        action="store_true",
+        default=False,
+        help="reach kubernetes pods at their IPs instead of per-pod NodePort services",
+    )
+    run_subparser.add_argument(
+        "--confirm-funding",
+        action="store_true",
+        default=False,
+        help="mine a block right after funding the distributors",
+    )
+    run_subparser.add_argument(
+        "--distributors",
+        type=int,
+        default=1,
+        help="number of distributor wallets paying invoices in parallel",
+    )
+    run_subparser.add_argument(
+        "--startup-window",
+        type=int,
+        default=STARTUP_WINDOW,
+        help="maximum number of clients starting concurrently",
+    )
+    run_subparser.add_argument(
+        "--startup-workers",
+        type=int,
+        default=32,
+        help="number of concurrent API calls when clients are created in bulk",
+    )
+    run_subparser.add_argument(
+        "--adaptive-startup",
+        action="store_true",
+        default=False,
+        help="adapt the startup window to the host load",
+    )
+    run_subparser.add_argument(
+        "--startup-retries",
+        type=int,
+        default=3,
+        help="number of restarts of a client that failed to start",
+    )
+    run_subparser.add_argument(
+        "--address-workers",
+        type=int,
+        default=ADDRESS_WORKERS,
+        help="number of clients generating invoice addresses concurrently",
+    )
+    run_subparser.add_argument(
+        "--address-cache",
+        action="store_true",
+        default=False,
+        help="reuse invoice addresses stored in the logs directory by a previous run",
+    )
+    run_subparser.add_argument(
+        "--no-rpc-metrics",
+        action="store_true",
+        default=False,
+        help="do not record RPC latency histograms and error counts",
+    )
+    run_subparser.add_argument(
+        "--rpc-metrics-interval",
+        type=int,
+        default=0,
+        help="dump RPC metrics to the logs directory every N seconds (0 to disable)",
+    )
+    run_subparser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=0,
+        help="serve live metrics in the Prometheus text format on this port",
+    )
+    run_subparser.add_argument(
+        "--metrics-host",
+        type=str,
+        default="127.0.0.1",
+        help="address the metrics endpoint is bound to",
+    )
+    run_subparser.add_argument(
+        "--resource-interval",
+        type=float,
+        default=0,
+        help="sample container CPU, memory, network and block I/O every N seconds",
+    )
+    run_subparser.add_argument(
+        "--fake-latency",
+        type=float,
+        default=0.0,
+        help="seconds added to every mocked RPC of the fake driver",
+    )
+    run_subparser.add_argument(
+        "--fake-failure-rate",
+        type=float,
+        default=0.0,
+        help="fraction of mocked RPCs of the fake driver that fail",
+    )
+    run_subparser.add_argument(
+        "--fake-round-interval",
+        type=float,
+        default=10,
+        help="seconds between mocked coinjoin rounds of the fake driver",
+    )
+    run_subparser.add_argument(
+        "--fake-block-interval",
+        type=float,
+        default=10,
+        help="seconds between blocks mined by the fake driver (0 to disable)",
+    )
+    run_subparser.add_argument(
+        "--fake-stats",
+        type=str,
+        default="",
+        help="store phase timings and resource usage of a fake driver run to a file",
+    )
 
     clean_subparser = subparsers.add_parser("clean", help="clean up")
     clean_subparser.add_argument("--namespace", type=str, default="coinjoin")
@@ -590,28 +1521,26 @@ if __name__ == "__main__":
     genscen_subparser = subparsers.add_parser("genscen", help="generate scenario file")
     manager.commands.genscen.setup_parser(genscen_subparser)
 
+    bench_subparser = subparsers.add_parser("bench", help="run manager benchmarks")
+    manager.commands.bench.setup_parser(bench_subparser)
+
     args = parser.parse_args()
 
+    if getattr(args, "pod_addressing", False) and args.driver != "kubernetes":
+        parser.error("--pod-addressing requires --driver kubernetes")
+
     if args.command == "genscen":
         manager.commands.genscen.handler(args)
         exit(0)
 
-    match args.driver:
-        case "docker":
-            from manager.driver.docker import DockerDriver
-
-            driver = DockerDriver(args.namespace)
-        case "podman":
-            from manager.driver.podman import PodmanDriver
-
-            driver = PodmanDriver()
-        case "kubernetes":
-            from manager.driver.kubernetes import KubernetesDriver
+    if args.command == "bench":
+        manager.commands.bench.handler(args)
+        exit(0)
 
-            driver = KubernetesDriver(args.namespace, args.reuse_namespace)
-        case _:
-            print(f"Unknown driver '{args.driver}'")
-            exit(1)
+    driver = create_driver()
+    if driver is None:
+        print(f"Unknown driver '{args.driver}'")
+        exit(1)
 
     if args.command == "run":
         if args.scenario:
@@ -631,6 +1560,12 @@ if __name__ == "__main__":
         case "clean":
             driver.cleanup(args.image_prefix)
         case "run":
+            scheduler.reconcile_interval = args.reconcile_interval
+            rpc.configure(
+                pool_maxsize=args.rpc_pool_size,
+                async_concurrency=args.concurrency,
+                record_metrics=not args.no_rpc_metrics,
+            )
             run()
         case _:
             print(f"Unknown command '{args.command}'")
@@ -0,0 +1,82 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from time import sleep, time
+from manager import timing
+
+WORKERS = 16
+RETRIES = 3
+
+
+class AddressPool:
+    def __init__(self, workers=WORKERS, retries=RETRIES, cache_path=None):
+        self.workers = workers
+        self.retries = retries
+        self.cache_path = cache_path
+        self.generated = 0
+        self.cached = 0
+        self.elapsed = 0.0
+
+    def load_cache(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return {}
+        with open(self.cache_path, "r") as f:
+            return json.load(f)
+
+    def store_cache(self, addresses):
+        if not self.cache_path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.cache_path)), exist_ok=True)
+        with open(self.cache_path, "w") as f:
+            json.dump(addresses, f, indent=2)
+
+    def _new_address(self, client):
+        for attempt in range(self.retries):
+            try:
+                return client.get_new_address()
+            except Exception:
+                if attempt == self.retries - 1:
+                    raise
+                sleep(2**attempt)
+
+    def _cached(self, client, addresses):
+        # a restarted container has a fresh wallet, reuse only its own addresses
+        try:
+            keys = client.list_keys()
+            known = {key.get("address") for key in keys}
+        except Exception:
+            return []
+        return [address for address in addresses if address in known]
+
+    def _fill(self, client, count, cached):
+        with timing.span(client.name, "addresses"):
+            addresses = self._cached(client, cached)[:count] if cached else []
+            reused = len(addresses)
+            while len(addresses) < count:
+                addresses.append(self._new_address(client))
+        return addresses, reused
+
+    def generate(self, demands):
+        start = time()
+        cache = self.load_cache()
+        with ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="addresses"
+        ) as executor:
+            futures = {
+                client.name: executor.submit(
+                    self._fill, client, count, cache.get(client.name)
+                )
+                for client, count in demands
+                if count > 0
+            }
+            addresses = {}
+            for name, future in futures.items():
+                addresses[name], reused = future.result()
+                self.cached += reused
+                self.generated += len(addresses[name]) - reused
+        self.elapsed = time() - start
+        self.store_cache(addresses)
+        return addresses
+
+    def rate(self):
+        return (self.generated + self.cached) / self.elapsed if self.elapsed else 0.0
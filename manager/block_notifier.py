@@ -0,0 +1,170 @@
+import threading
+from time import time
+from urllib.parse import urlparse
+
+try:
+    import zmq
+    from zmq.utils.monitor import recv_monitor_message
+except ImportError:
+    zmq = None
+
+HASHBLOCK_PORT = 28332
+RAWTX_PORT = 28333
+# seconds without a notified block after which the block count is cross-checked
+CHECK_INTERVAL = 30
+
+
+class BlockNotifier:
+    def __init__(
+        self,
+        host="localhost",
+        hashblock_port=HASHBLOCK_PORT,
+        rawtx_port=RAWTX_PORT,
+        proxy="",
+        check_interval=CHECK_INTERVAL,
+    ):
+        self.host = host
+        self.hashblock_port = hashblock_port
+        self.rawtx_port = rawtx_port
+        self.proxy = proxy
+        self.check_interval = check_interval
+        self.blocks = 0
+        self.reconnects = 0
+        self.stale = False
+        self.transactions = 0
+        self.last_block_time = None
+        self.last_tx_time = None
+        self.alive = False
+        self._block = threading.Event()
+        self._block.set()
+        self._context = None
+        self._thread = None
+        self._base = None
+        self._missed = False
+        self._last_reconnect = 0
+        self._reconnect = threading.Event()
+
+    def _endpoint(self, port):
+        return f"tcp://{self.host}:{port}"
+
+    def _socket(self, topic, port, timeout):
+        socket = self._context.socket(zmq.SUB)
+        if self.proxy:
+            proxy = urlparse(self.proxy)
+            if not proxy.scheme.startswith("socks5"):
+                raise Exception(f"unsupported proxy for ZMQ ({self.proxy})")
+            socket.setsockopt(zmq.SOCKS_PROXY, proxy.netloc.encode())
+        socket.setsockopt(zmq.SUBSCRIBE, topic)
+        monitor = socket.get_monitor_socket()
+        socket.connect(self._endpoint(port))
+        # a TCP connect alone does not mean the endpoint speaks ZMQ
+        deadline = time() + timeout
+        try:
+            while True:
+                remaining = deadline - time()
+                if remaining <= 0 or not monitor.poll(remaining * 1000):
+                    raise Exception(f"no ZMQ handshake with {self.host}:{port}")
+                event = recv_monitor_message(monitor)["event"]
+                if event == zmq.EVENT_HANDSHAKE_SUCCEEDED:
+                    break
+        finally:
+            socket.disable_monitor()
+            monitor.close()
+        return socket
+
+    def start(self, timeout=5):
+        if zmq is None:
+            print("- ZMQ notifications unavailable (pyzmq not installed)")
+            return False
+        self._context = zmq.Context()
+        try:
+            sockets = {}
+            for topic, port in (
+                (b"hashblock", self.hashblock_port),
+                (b"rawtx", self.rawtx_port),
+            ):
+                if port:
+                    sockets[self._socket(topic, port, timeout)] = self._endpoint(port)
+        except Exception as e:
+            print(f"- ZMQ notifications unavailable ({e})")
+            self._context.destroy(linger=0)
+            return False
+        self.alive = True
+        self._thread = threading.Thread(
+            target=self._listen, args=(sockets,), daemon=True
+        )
+        self._thread.start()
+        return True
+
+    def _listen(self, sockets):
+        poller = zmq.Poller()
+        for socket in sockets:
+            poller.register(socket, zmq.POLLIN)
+        last_check = time()
+        try:
+            while self.alive:
+                events = poller.poll(1000)
+                if self._reconnect.is_set():
+                    self._reconnect.clear()
+                    self.reconnects += 1
+                    for socket, endpoint in sockets.items():
+                        socket.disconnect(endpoint)
+                        socket.connect(endpoint)
+                elif time() - last_check > self.check_interval:
+                    # silence between blocks is normal, let the manager poll once
+                    last_check = time()
+                    self._block.set()
+                for socket, _ in events:
+                    topic, _, _ = socket.recv_multipart()
+                    if topic == b"hashblock":
+                        self.blocks += 1
+                        self.last_block_time = time()
+                        if self.stale:
+                            # blocks missed while stale do not count as missed later
+                            self.stale = False
+                            self._base = None
+                        last_check = time()
+                        self._block.set()
+                    elif topic == b"rawtx":
+                        self.transactions += 1
+                        self.last_tx_time = time()
+        except Exception:
+            pass
+        finally:
+            self.alive = False
+            for socket in sockets:
+                socket.close(linger=0)
+
+    def cross_check(self, block_count):
+        # blocks mined but not notified at two checks in a row mean the subscription
+        # went stale, e.g. after a btc-node restart, poll until it recovers
+        if self._base is None:
+            self._base = block_count, self.blocks
+            return
+        height, notified = self._base
+        missed = block_count - height > self.blocks - notified
+        if not (missed and self._missed):
+            self._missed = missed
+            return
+        if time() - self._last_reconnect > self.check_interval:
+            self.stale = True
+            self._base = None
+            self._missed = False
+            self._last_reconnect = time()
+            self._reconnect.set()
+
+    def take(self):
+        if self._block.is_set():
+            self._block.clear()
+            return True
+        return False
+
+    def wait(self, timeout=None):
+        return self._block.wait(timeout)
+
+    def stop(self):
+        self.alive = False
+        if self._thread is not None:
+            self._thread.join()
+        if self._context is not None:
+            self._context.term()
@@ -1,6 +1,7 @@
 import requests
-import json
 from time import sleep
+from manager import rpc
+from manager.utils import backoff
 
 WALLET = "wallet"
 
@@ -12,23 +13,53 @@ class BtcNode:
         self.internal_ip = internal_ip
         self.proxy = proxy
 
+    def _endpoint(self):
+        return rpc.endpoint(
+            self.host, self.port, self.proxy, ("user", "password"), name="btc-node"
+        )
+
     def _rpc(self, request, wallet=None):
         request["jsonrpc"] = "2.0"
         request["id"] = "1"
         try:
-            response = requests.post(
-                f"http://{self.host}:{self.port}"
-                + ("/wallet/" + WALLET if wallet else ""),
-                data=json.dumps(request),
-                auth=("user", "password"),
-                proxies=dict(http=self.proxy),
-                timeout=5,
+            response = self._endpoint().post(
+                request, path=("wallet/" + WALLET if wallet else ""), timeout=5
+            )
+        except requests.exceptions.Timeout:
+            return "timeout"
+        if response["error"] is not None:
+            raise Exception(response["error"])
+        return response["result"]
+
+    def batch(self, calls, wallet=None, timeout=30):
+        payload = [
+            {
+                "jsonrpc": "2.0",
+                "id": str(idx),
+                "method": call["method"],
+                "params": call.get("params", []),
+            }
+            for idx, call in enumerate(calls)
+        ]
+        if not payload:
+            return []
+        try:
+            response = self._endpoint().post(
+                payload, path=("wallet/" + WALLET if wallet else ""), timeout=timeout
             )
         except requests.exceptions.Timeout:
             return "timeout"
-        if response.json()["error"] is not None:
-            raise Exception(response.json()["error"])
-        return response.json()["result"]
+        if not isinstance(response, list):
+            # the whole batch was rejected, e.g. a parse error
+            raise Exception(
+                response.get("error") if isinstance(response, dict) else response
+            )
+        results = [None] * len(payload)
+        for item in response:
+            if item["error"] is not None:
+                raise Exception(item["error"])
+            results[int(item["id"])] = item["result"]
+        return results
 
     def get_block_count(self):
         request = {
@@ -51,6 +82,19 @@ class BtcNode:
         }
         return self._rpc(request)
 
+    def get_block_hashes(self, heights):
+        return self.batch(
+            [{"method": "getblockhash", "params": [height]} for height in heights]
+        )
+
+    def get_block_infos(self, block_hashes):
+        return self.batch(
+            [
+                {"method": "getblock", "params": [block_hash, 2]}
+                for block_hash in block_hashes
+            ]
+        )
+
     def mine_block(self, count=1):
         initial_block_count = self.get_block_count()
 
@@ -75,12 +119,22 @@ class BtcNode:
         }
         self._rpc(request, WALLET)
 
+    def fund_addresses(self, amounts, confirm=False):
+        request = {
+            "method": "sendmany",
+            "params": ["", amounts],
+        }
+        txid = self._rpc(request, WALLET)
+        if confirm and str(txid) != "timeout":
+            self.mine_block()
+        return txid
+
     def wait_ready(self):
-        while True:
+        for delay in backoff():
             try:
                 block_count = self.get_block_count()
                 if block_count > 100:
                     break
             except Exception:
                 pass
-            sleep(0.1)
+            sleep(delay)
@@ -0,0 +1,312 @@
+import argparse
+import filecmp
+import glob
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+from io import BytesIO
+from time import perf_counter
+from multiprocessing.pool import ThreadPool
+import requests
+from manager import rpc
+from manager.utils import format_transfer
+from manager.mock.rpc_server import JsonRpcServer
+
+
+def setup_parser(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "target",
+        type=str,
+        choices=["rpc", "k8s-transfer", "scale"],
+        help="benchmark to run",
+    )
+    parser.add_argument(
+        "--calls", type=int, default=2000, help="number of calls per measurement"
+    )
+    parser.add_argument(
+        "--threads", type=int, default=8, help="number of concurrent callers"
+    )
+    parser.add_argument(
+        "--pool-size", type=int, default=rpc.POOL_MAXSIZE, help="RPC pool size"
+    )
+    parser.add_argument(
+        "--size", type=int, default=64, help="transferred data size in MiB"
+    )
+    parser.add_argument(
+        "--wallets",
+        type=lambda x: [int(n) for n in x.split(",")],
+        default=[10, 100, 1000, 10000],
+        help="comma-separated scenario sizes of the scale benchmark",
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="mocked RPC latency in seconds"
+    )
+    parser.add_argument(
+        "--failure-rate", type=float, default=0.0, help="fraction of failed mocked RPCs"
+    )
+
+
+def measure(call, calls, threads):
+    start = perf_counter()
+    if threads <= 1:
+        for _ in range(calls):
+            call()
+    else:
+        with ThreadPool(threads) as pool:
+            pool.map(lambda _: call(), range(calls))
+    return calls / (perf_counter() - start)
+
+
+def bench_rpc(args):
+    rpc.configure(pool_maxsize=args.pool_size)
+    server = JsonRpcServer({"getblockcount": lambda: 201}).start()
+    request = {"jsonrpc": "2.0", "id": "1", "method": "getblockcount", "params": []}
+
+    def legacy_call():
+        response = requests.post(
+            f"http://{server.host}:{server.port}",
+            data=json.dumps(request),
+            auth=("user", "password"),
+            proxies=dict(http=""),
+            timeout=5,
+        )
+        if response.json()["error"] is not None:
+            raise Exception(response.json()["error"])
+        return response.json()["result"]
+
+    def pooled_call():
+        response = rpc.endpoint(
+            server.host, server.port, "", ("user", "password")
+        ).post(request, timeout=5)
+        if response["error"] is not None:
+            raise Exception(response["error"])
+        return response["result"]
+
+    print(f"Benchmarking RPC transport ({args.calls} calls)")
+    try:
+        for threads in sorted({1, args.threads}):
+            legacy = measure(legacy_call, args.calls, threads)
+            rpc.configure(record_metrics=False)
+            pooled = measure(pooled_call, args.calls, threads)
+            rpc.configure(record_metrics=True)
+            recorded = measure(pooled_call, args.calls, threads)
+            print(
+                f"- {threads} thread(s): requests.post {legacy:.0f} calls/s, "
+                f"pooled {pooled:.0f} calls/s ({pooled / legacy:.2f}x), "
+                f"pooled with metrics {recorded:.0f} calls/s "
+                f"({recorded / pooled:.2f}x)"
+            )
+    finally:
+        rpc.close_all()
+        server.stop()
+
+
+def prepare_transfer_data(path, size):
+    # half compressible log lines, half random binary data
+    os.makedirs(os.path.join(path, "logs"))
+    line = b"2024-01-01 00:00:00.000 [1] INFO\tCoinJoinClient: round progressed\n"
+    with open(os.path.join(path, "logs", "Log.txt"), "wb") as f:
+        f.write(line * (size * 2**19 // len(line)))
+    with open(os.path.join(path, "logs", "Wallet.dat"), "wb") as f:
+        f.write(os.urandom(size * 2**19))
+
+
+def legacy_download(kubernetes_driver, src_path, dst_path):
+    from kubernetes.stream import stream
+
+    src_parent, src_target = os.path.split(src_path)
+    resp = stream(
+        kubernetes_driver.client.connect_get_namespaced_pod_exec,
+        "bench",
+        kubernetes_driver.namespace,
+        command=["tar", "cf", "-", "-C", src_parent, src_target],
+        stderr=True,
+        stdin=True,
+        stdout=True,
+        tty=False,
+        _preload_content=False,
+    )
+    fo = BytesIO()
+    while resp.is_open():
+        resp.update(timeout=1)
+        if resp.peek_stdout():
+            fo.write(resp.read_stdout().encode())
+    fo.seek(0)
+    with tarfile.open(fileobj=fo) as tar:
+        tar.extractall(dst_path)
+    resp.close()
+
+
+def verify_transfer(src_path, dst_path):
+    comparison = filecmp.dircmp(src_path, dst_path)
+    if comparison.left_only or comparison.right_only:
+        return False
+    _, mismatch, errors = filecmp.cmpfiles(
+        src_path, dst_path, comparison.common_files, shallow=False
+    )
+    return not mismatch and not errors
+
+
+def bench_k8s_transfer(args):
+    from kubernetes import client
+    from manager.driver.kubernetes import KubernetesDriver
+    from manager.mock.kube_server import KubeExecServer
+
+    server = KubeExecServer().start()
+    configuration = client.Configuration()
+    configuration.host = f"http://{server.host}:{server.port}"
+    api_client = client.ApiClient(configuration)
+    work_path = tempfile.mkdtemp()
+    src_path = os.path.join(work_path, "src")
+    prepare_transfer_data(src_path, args.size)
+    size = sum(
+        os.path.getsize(os.path.join(src_path, "logs", f))
+        for f in os.listdir(os.path.join(src_path, "logs"))
+    )
+
+    print(f"Benchmarking Kubernetes exec transfers ({size / 2**20:.0f} MiB)")
+    try:
+        methods = [
+            ("text (legacy)", None),
+            ("binary", KubernetesDriver("bench", True, False, api_client)),
+            ("binary gzip", KubernetesDriver("bench", True, True, api_client)),
+        ]
+        for label, kubernetes_driver in methods:
+            dst_path = os.path.join(work_path, "dst")
+            start = perf_counter()
+            try:
+                if kubernetes_driver is None:
+                    legacy_download(
+                        KubernetesDriver("bench", True, False, api_client),
+                        os.path.join(src_path, "logs"),
+                        dst_path,
+                    )
+                else:
+                    kubernetes_driver.download(
+                        "bench", os.path.join(src_path, "logs/"), dst_path
+                    )
+                elapsed = perf_counter() - start
+                intact = verify_transfer(
+                    os.path.join(src_path, "logs"), os.path.join(dst_path, "logs")
+                )
+                print(
+                    f"- download {label}: {format_transfer(size, elapsed)}, "
+                    f"{'intact' if intact else 'corrupted'}"
+                )
+            except Exception as e:
+                print(f"- download {label}: failed ({e})")
+            shutil.rmtree(dst_path, ignore_errors=True)
+
+        upload_src = os.path.join(src_path, "logs", "Wallet.dat")
+        upload_dst = os.path.join(work_path, "upload", "Wallet.dat")
+        os.makedirs(os.path.dirname(upload_dst))
+        upload_size = os.path.getsize(upload_src)
+        start = perf_counter()
+        methods[1][1].upload("bench", upload_src, upload_dst)
+        elapsed = perf_counter() - start
+        intact = filecmp.cmp(upload_src, upload_dst, shallow=False)
+        print(
+            f"- upload binary: {format_transfer(upload_size, elapsed)}, "
+            f"{'intact' if intact else 'corrupted'}"
+        )
+    finally:
+        shutil.rmtree(work_path, ignore_errors=True)
+        server.stop()
+
+
+def scale_scenario(wallets):
+    return {
+        "name": f"scale-{wallets}",
+        "rounds": 3,
+        "blocks": 0,
+        "default_version": "2.0.4",
+        "wallets": [{"funds": [200000, 50000]} for _ in range(wallets)],
+    }
+
+
+def remove_logs(root, name):
+    for path in glob.glob(os.path.join(root, "logs", f"*_{name}*")):
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+
+
+def bench_scale(args):
+    # full manager runs against the fake driver, measured from the outside
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    work_path = tempfile.mkdtemp()
+    print(f"Benchmarking manager scaling ({args.latency} s mocked RPC latency)")
+    try:
+        for wallets in args.wallets:
+            scenario = scale_scenario(wallets)
+            scenario_path = os.path.join(work_path, "scenario.json")
+            stats_path = os.path.join(work_path, "stats.json")
+            with open(scenario_path, "w") as f:
+                json.dump(scenario, f)
+            command = [
+                sys.executable,
+                "manager.py",
+                "--driver",
+                "fake",
+                "run",
+                "--scenario",
+                scenario_path,
+                "--control-ip",
+                "127.0.0.1",
+                "--fake-latency",
+                str(args.latency),
+                "--fake-failure-rate",
+                str(args.failure_rate),
+                "--fake-round-interval",
+                "1",
+                "--fake-stats",
+                stats_path,
+            ]
+            start = perf_counter()
+            with open(os.path.join(work_path, f"{scenario['name']}.log"), "w") as log:
+                subprocess.run(command, cwd=root, stdout=log, stderr=subprocess.STDOUT)
+            elapsed = perf_counter() - start
+            remove_logs(root, scenario["name"])
+            if not os.path.exists(stats_path):
+                print(f"- {wallets} wallets: failed after {elapsed:.1f} seconds")
+                continue
+            with open(stats_path) as f:
+                stats = json.load(f)
+            os.remove(stats_path)
+            print(
+                f"- {wallets} wallets ({stats['clients']} started): "
+                f"{elapsed:.1f} s wall, {stats['mock']['rpcs'] / elapsed:.0f} RPCs/s, "
+                f"{stats['mock']['errors']} errors, "
+                f"manager {stats['manager_cpu']:.1f} s CPU, "
+                f"{stats['manager_max_rss'] / 2**20:.0f} MiB RSS"
+            )
+            print(
+                "  "
+                + ", ".join(
+                    f"{name} {seconds:.1f} s"
+                    for name, seconds in stats["phases"].items()
+                )
+            )
+    finally:
+        shutil.rmtree(work_path, ignore_errors=True)
+
+
+def handler(args):
+    match args.target:
+        case "rpc":
+            bench_rpc(args)
+        case "k8s-transfer":
+            bench_k8s_transfer(args)
+        case "scale":
+            bench_scale(args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run manager benchmarks")
+    setup_parser(parser)
+    handler(parser.parse_args())
@@ -0,0 +1,170 @@
+import queue
+import threading
+from time import time
+from manager import timing, utils
+from manager.utxo_index import UtxoIndex, coin_keys
+
+BATCH_SIZE = 5
+RETRIES = 3
+# satoshis kept above the invoice amounts for the transaction fee
+FEE_MARGIN = 10_000
+
+
+class DistributorStats:
+    def __init__(self, name):
+        self.name = name
+        self.invoices = 0
+        self.batches = 0
+        self.errors = 0
+        self.busy = 0.0
+
+    def throughput(self):
+        return self.invoices / self.busy if self.busy else 0.0
+
+
+class DistributorPool:
+    def __init__(
+        self, distributors, batch_size=BATCH_SIZE, retries=RETRIES, on_paid=None
+    ):
+        self.distributors = distributors
+        self.batch_size = batch_size
+        self.retries = retries
+        self.on_paid = on_paid
+        self.stats = [DistributorStats(client.name) for client in distributors]
+        self.indexes = [UtxoIndex(client) for client in distributors]
+        self.error = None
+        self._queues = [queue.Queue() for _ in distributors]
+        self._next = 0
+        self._pending = 0
+        self._submitted = 0
+        self._lock = threading.Lock()
+        self._threads = []
+        self._stopped = False
+
+    def start(self):
+        for idx in range(len(self.distributors)):
+            thread = threading.Thread(target=self._work, args=(idx,), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def submit(self, invoices):
+        # round-robin over shards so every distributor gets whole batches
+        for batch in utils.batched(invoices, self.batch_size):
+            with self._lock:
+                self._pending += len(batch)
+                self._submitted += len(batch)
+            self._queues[self._next].put(batch)
+            self._next = (self._next + 1) % len(self._queues)
+
+    def pending(self):
+        return self._pending
+
+    def check(self):
+        if self.error is not None:
+            raise self.error
+
+    def join(self):
+        for shard in self._queues:
+            shard.join()
+        self.check()
+
+    def stop(self, timeout=10):
+        # queued batches are dropped, in-flight sends get a grace period
+        self._stopped = True
+        for shard in self._queues:
+            shard.put(None)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _work(self, idx):
+        distributor = self.distributors[idx]
+        stats = self.stats[idx]
+        index = self.indexes[idx]
+        shard = self._queues[idx]
+        try:
+            index.refresh()
+        except Exception as e:
+            print(f"- could not list coins ({distributor.name}, {e})")
+        while (batch := shard.get()) is not None:
+            start = time()
+            try:
+                if self.error is None and not self._stopped:
+                    self._pay(distributor, stats, index, batch)
+            except Exception as e:
+                self.error = e
+            finally:
+                end = time()
+                stats.busy += end - start
+                timing.record(
+                    distributor.name, "payment", start, end, invoices=len(batch)
+                )
+                with self._lock:
+                    self._pending -= len(batch)
+                shard.task_done()
+        shard.task_done()
+
+    def _select(self, index, cost, exclude):
+        coins = index.select(cost + FEE_MARGIN, exclude)
+        if coins is None:
+            # change outputs of earlier payments are picked up on refresh
+            index.refresh()
+            coins = index.select(cost + FEE_MARGIN, exclude)
+        if coins is None:
+            raise Exception("Not enough BTC")
+        return coins
+
+    def _pay(self, distributor, stats, index, batch):
+        cost = sum(amount for _, amount in batch)
+        refresh = False
+        # coins of a failed send are not retried, e.g. when they cannot pay the fee
+        failed = set()
+        for _ in range(self.retries):
+            coins = None
+            try:
+                # a failed send may still have spent its coins, drop them first
+                if refresh:
+                    index.refresh()
+                coins = self._select(index, cost, failed)
+                result = distributor.send(batch, coins)
+                if str(result) == "timeout":
+                    print(f"- transaction timeout ({distributor.name})")
+                    stats.errors += 1
+                    index.release(coins)
+                    failed.update(coin_keys(coins))
+                    refresh = True
+                    continue
+                index.spend(coins)
+                stats.invoices += len(batch)
+                stats.batches += 1
+                if self.on_paid is not None:
+                    self.on_paid(batch)
+                return
+            except Exception as e:
+                stats.errors += 1
+                if coins is not None:
+                    index.release(coins)
+                    failed.update(coin_keys(coins))
+                refresh = True
+                # https://github.com/zkSNACKs/WalletWasabi/issues/12764
+                if "Bad Request" in str(e):
+                    print(f"- transaction error ({distributor.name}, bad request)")
+                else:
+                    print(f"- transaction error ({distributor.name}, {e})")
+        print(f"- invoice payment failed ({distributor.name})")
+        raise Exception("Invoice payment failed")
+
+    def unpaid(self):
+        # dropped on stop, failed or still in flight
+        return self._submitted - sum(stats.invoices for stats in self.stats)
+
+    def summary(self):
+        lines = [
+            f"{stats.name}: {stats.invoices} invoices in {stats.batches} batches, "
+            f"{stats.errors} errors ({stats.throughput():.2f} invoices/s)"
+            for stats in self.stats
+        ]
+        if self.unpaid():
+            lines.append(f"{self.unpaid()} invoices left unpaid")
+        return lines
@@ -1,14 +1,143 @@
 from abc import ABC, abstractmethod
 from multiprocessing.pool import ThreadPool
+from time import perf_counter
+import threading
+
+# the follower prints its PID first, so that it can be killed once abandoned
+FOLLOW_SCRIPT = 'echo $$; exec tail -c "+$1" -F "$2"'
+
+
+def follow_command(path, offset=0):
+    return ["sh", "-c", FOLLOW_SCRIPT, "follow", str(offset + 1), path]
+
+
+class FileFollower:
+    def __init__(self, driver, name, path):
+        self.driver = driver
+        self.name = name
+        self.path = path
+        self.offset = 0
+
+    def read(self):
+        data = self.driver.tail(self.name, self.path, self.offset)
+        self.offset += len(data)
+        return data
+
+    def close(self):
+        pass
+
+
+class StreamFollower(FileFollower):
+    # streams the output of follow_command, kill stops the remote process by PID
+    def __init__(self, driver, name, path, open_stream, kill=None):
+        super().__init__(driver, name, path)
+        self._open_stream = open_stream
+        self._kill = kill
+        self._buffer = bytearray()
+        self._lock = threading.Lock()
+        self._chunks = None
+        self._thread = None
+        self._pid = None
+        self._closed = False
+
+    def _pump(self, chunks):
+        header = bytearray()
+        try:
+            for chunk in chunks:
+                if header is not None:
+                    header += chunk
+                    if b"\n" not in header:
+                        continue
+                    pid, _, chunk = bytes(header).partition(b"\n")
+                    self._pid = int(pid)
+                    header = None
+                    if self._closed:
+                        self._stop_remote()
+                        return
+                with self._lock:
+                    self._buffer += chunk
+        except Exception:
+            pass
+
+    def _stop_remote(self):
+        pid, self._pid = self._pid, None
+        if pid is not None and self._kill is not None:
+            try:
+                self._kill(pid)
+            except Exception:
+                pass
+
+    def read(self):
+        alive = self._thread is not None and self._thread.is_alive()
+        with self._lock:
+            data = bytes(self._buffer)
+            self._buffer.clear()
+        self.offset += len(data)
+        if not alive:
+            # a dropped stream may have left its process behind
+            self._stop_remote()
+            # the stream is opened in the calling thread, only reading is delegated
+            self._chunks = self._open_stream(self.offset)
+            self._thread = threading.Thread(
+                target=self._pump, args=(self._chunks,), daemon=True
+            )
+            self._thread.start()
+        return data
+
+    def close(self):
+        self._closed = True
+        if self._chunks is not None:
+            try:
+                self._chunks.close()
+            except Exception:
+                pass
+        self._stop_remote()
+
+
+class TimedDriver:
+    # records the duration of container operations, delegates everything else
+    TIMED = (
+        "run",
+        "run_many",
+        "wait_healthy",
+        "stop",
+        "download",
+        "peek",
+        "tail",
+        "upload",
+    )
+
+    def __init__(self, driver, histograms):
+        self.driver = driver
+        self.histograms = histograms
+
+    def __getattr__(self, name):
+        attr = getattr(self.driver, name)
+        if name not in self.TIMED:
+            return attr
+
+        def timed(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return attr(*args, **kwargs)
+            finally:
+                self.histograms.observe(name, perf_counter() - start)
+
+        return timed
 
 
 class Driver(ABC):
+    # whether creating all containers up front beats the admission window
+    bulk_run = False
+    # whether sample() reports the resource usage of the containers
+    supports_sampling = False
+
     @abstractmethod
     def has_image(self, name):
         pass
 
     @abstractmethod
-    def build(self, name, path):
+    def build(self, name, path, buildargs=None):
         pass
 
     @abstractmethod
@@ -25,9 +154,28 @@ class Driver(ABC):
         skip_ip=False,
         cpu=0.1,
         memory=768,
+        healthcheck=None,
     ):
         pass
 
+    def run_many(self, containers, workers=8):
+        def run(container):
+            try:
+                return self.run(**container)
+            except Exception as e:
+                return e
+
+        with ThreadPool(workers) as p:
+            return p.map(run, containers)
+
+    def wait_healthy(self, name, timeout=None):
+        # None when the backend exposes no health state for the container
+        return None
+
+    def sample(self):
+        # latest resource usage of the simulation containers, keyed by name
+        return {}
+
     @abstractmethod
     def stop(self, name):
         pass
@@ -44,6 +192,12 @@ class Driver(ABC):
     def peek(self, name, path):
         pass
 
+    def tail(self, name, path, offset=0):
+        return self.peek(name, path).encode()[offset:]
+
+    def follow(self, name, path):
+        return FileFollower(self, name, path)
+
     @abstractmethod
     def upload(self, name, src_path, dst_path):
         pass
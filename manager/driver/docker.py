@@ -2,11 +2,142 @@ from functools import cached_property
 from io import BytesIO
 import os
 import tarfile
-from . import Driver
+import threading
+from time import sleep, time
+from . import Driver, StreamFollower, follow_command
+from ..utils import backoff, extract_stream, read_stream_file, format_transfer
 import docker
 
+# CPU limits are enforced as a quota of this period in microseconds
+CPU_PERIOD = 100_000
+# every stats stream holds a connection of its own
+STATS_POOL_SIZE = 1024
+
+
+def health_command(container):
+    test = (container.attrs["Config"].get("Healthcheck") or {}).get("Test") or []
+    if test[:1] == ["CMD"]:
+        return test[1:]
+    if test[:1] == ["CMD-SHELL"]:
+        return ["/bin/sh", "-c", test[1]]
+    return None
+
+
+def wait_container_healthy(get_container, timeout=None):
+    # health checks are defined by the HEALTHCHECK instruction of the images
+    start = time()
+    for delay in backoff(initial=0.5):
+        try:
+            container = get_container()
+        except docker.errors.NotFound:
+            return False
+        health = container.attrs["State"].get("Health")
+        if health is None:
+            return None
+        if health["Status"] == "healthy":
+            return True
+        if health["Status"] == "unhealthy":
+            return False
+        # the check interval would round startup up, run the check on the backoff
+        command = health_command(container)
+        try:
+            if command and container.exec_run(command).exit_code == 0:
+                return True
+        except docker.errors.APIError:
+            pass
+        if timeout is not None and time() - start > timeout:
+            return False
+        sleep(delay)
+
+
+def parse_stats(stats):
+    cpu = stats.get("cpu_stats", {})
+    precpu = stats.get("precpu_stats", {})
+    cpu_delta = cpu.get("cpu_usage", {}).get("total_usage", 0)
+    cpu_delta -= precpu.get("cpu_usage", {}).get("total_usage", 0)
+    system_delta = cpu.get("system_cpu_usage", 0) - precpu.get("system_cpu_usage", 0)
+    memory = stats.get("memory_stats", {})
+    # page cache is reclaimable, cgroup v2 reports it as inactive_file
+    cache = memory.get("stats", {}).get(
+        "inactive_file", memory.get("stats", {}).get("cache", 0)
+    )
+    networks = (stats.get("networks") or {}).values()
+    blkio = stats.get("blkio_stats", {}).get("io_service_bytes_recursive") or []
+    return {
+        "cpu": (
+            cpu_delta / system_delta * cpu.get("online_cpus", 1)
+            if system_delta > 0
+            else 0.0
+        ),
+        "memory": memory.get("usage", 0) - cache,
+        "net_rx": sum(network.get("rx_bytes", 0) for network in networks),
+        "net_tx": sum(network.get("tx_bytes", 0) for network in networks),
+        "block_read": sum(
+            entry["value"] for entry in blkio if entry["op"].lower() == "read"
+        ),
+        "block_write": sum(
+            entry["value"] for entry in blkio if entry["op"].lower() == "write"
+        ),
+    }
+
+
+class StatsStreams:
+    # one stats stream per container, only its latest sample is kept
+    def __init__(self, list_containers):
+        self.list_containers = list_containers
+        self.latest = {}
+        self._streams = set()
+        self._lock = threading.Lock()
+
+    def _pump(self, name, container):
+        try:
+            for stats in container.stats(stream=True, decode=True):
+                self.latest[name] = parse_stats(stats)
+        except Exception:
+            pass
+        finally:
+            # the stream ends with the container
+            with self._lock:
+                self._streams.discard(name)
+                self.latest.pop(name, None)
+
+    def sample(self):
+        containers = self.list_containers()
+        with self._lock:
+            for container in containers:
+                if container.name not in self._streams:
+                    self._streams.add(container.name)
+                    threading.Thread(
+                        target=self._pump,
+                        args=(container.name, container),
+                        daemon=True,
+                    ).start()
+            return dict(self.latest)
+
+
+def exec_tail(container, path, offset=0):
+    exit_code, output = container.exec_run(
+        ["tail", "-c", f"+{offset + 1}", path], stderr=False
+    )
+    if exit_code != 0:
+        raise Exception(f"could not read {path} (exit code {exit_code})")
+    return output
+
+
+def exec_follow(container, path, offset=0):
+    _, chunks = container.exec_run(
+        follow_command(path, offset), stderr=False, stream=True
+    )
+    return chunks
+
+
+def exec_kill(container, pid):
+    container.exec_run(["kill", str(pid)])
+
 
 class DockerDriver(Driver):
+    supports_sampling = True
+
     def __init__(self, namespace="coinjoin"):
         self.client = docker.from_env()
         self._namespace = namespace
@@ -22,8 +153,10 @@ class DockerDriver(Driver):
         except docker.errors.ImageNotFound:
             return False
 
-    def build(self, name, path):
-        self.client.images.build(path=path, tag=name, rm=True, nocache=True)
+    def build(self, name, path, buildargs=None):
+        self.client.images.build(
+            path=path, tag=name, rm=True, nocache=True, buildargs=buildargs
+        )
 
     def pull(self, name):
         self.client.images.pull(name)
@@ -37,6 +170,7 @@ class DockerDriver(Driver):
         skip_ip=False,
         cpu=0.1,
         memory=768,
+        healthcheck=None,
     ):
         self.client.containers.run(
             image,
@@ -47,9 +181,25 @@ class DockerDriver(Driver):
             network=self.network.id,
             ports=ports or {},
             environment=env or {},
+            cpu_period=CPU_PERIOD,
+            cpu_quota=int(cpu * CPU_PERIOD),
+            mem_limit=f"{memory}m",
         )
         return "", ports
 
+    def wait_healthy(self, name, timeout=None):
+        return wait_container_healthy(lambda: self.client.containers.get(name), timeout)
+
+    @cached_property
+    def stats_streams(self):
+        client = docker.from_env(max_pool_size=STATS_POOL_SIZE)
+        return StatsStreams(
+            lambda: client.containers.list(filters={"network": self._namespace})
+        )
+
+    def sample(self):
+        return self.stats_streams.sample()
+
     def stop(self, name):
         try:
             self.client.containers.get(name).stop()
@@ -58,27 +208,27 @@ class DockerDriver(Driver):
             pass
 
     def download(self, name, src_path, dst_path):
-        try:
-            stream, _ = self.client.containers.get(name).get_archive(src_path)
-
-            fo = BytesIO()
-            for d in stream:
-                fo.write(d)
-            fo.seek(0)
-            with tarfile.open(fileobj=fo) as tar:
-                tar.extractall(dst_path)
-        except:
-            pass
+        start = time()
+        stream, _ = self.client.containers.get(name).get_archive(src_path)
+        size = extract_stream(stream, dst_path)
+        elapsed = time() - start
+        print(f"- downloaded {name}:{src_path} ({format_transfer(size, elapsed)})")
 
     def peek(self, name, path):
         stream, _ = self.client.containers.get(name).get_archive(path)
+        return read_stream_file(stream, os.path.basename(path)).decode()
 
-        fo = BytesIO()
-        for d in stream:
-            fo.write(d)
-        fo.seek(0)
-        with tarfile.open(fileobj=fo) as tar:
-            return tar.extractfile(os.path.basename(path)).read().decode()
+    def tail(self, name, path, offset=0):
+        return exec_tail(self.client.containers.get(name), path, offset)
+
+    def follow(self, name, path):
+        return StreamFollower(
+            self,
+            name,
+            path,
+            lambda offset: exec_follow(self.client.containers.get(name), path, offset),
+            lambda pid: exec_kill(self.client.containers.get(name), pid),
+        )
 
     def upload(self, name, src_path, dst_path):
         fo = BytesIO()
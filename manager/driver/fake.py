@@ -0,0 +1,130 @@
+import multiprocessing
+import os
+import resource
+import threading
+from time import time
+from . import Driver
+from ..utils import format_transfer, raise_nofile_limit
+from ..mock import cluster
+
+# container ports answered by the mocks: bitcoind RPC, backend and client APIs
+SERVED_PORTS = (18443, 37127, 37128)
+_cluster = None
+_lock = threading.Lock()
+
+
+class ClusterProcess:
+    # the mocks run in their own process to keep them out of manager measurements
+    def __init__(self, options):
+        context = multiprocessing.get_context("spawn")
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=cluster.serve, args=(child_conn, options), daemon=True
+        )
+        self.process.start()
+        self._lock = threading.Lock()
+
+    def call(self, command, *params):
+        with self._lock:
+            self.conn.send((command, *params))
+            ok, result = self.conn.recv()
+        if not ok:
+            raise result
+        return result
+
+    def shutdown(self):
+        self.call("shutdown")
+        self.process.join()
+
+
+def shared_cluster(options):
+    # worker threads create their own drivers, all of them share the mocks
+    global _cluster
+    with _lock:
+        if _cluster is None or not _cluster.process.is_alive():
+            _cluster = ClusterProcess(options)
+        return _cluster
+
+
+class FakeDriver(Driver):
+    def __init__(
+        self, latency=0.0, failure_rate=0.0, round_interval=10, block_interval=10
+    ):
+        raise_nofile_limit()
+        self.cluster = shared_cluster(
+            dict(
+                latency=latency,
+                failure_rate=failure_rate,
+                round_interval=round_interval,
+                block_interval=block_interval,
+            )
+        )
+
+    def has_image(self, name):
+        return True
+
+    def build(self, name, path, buildargs=None):
+        pass
+
+    def pull(self, name):
+        pass
+
+    def run(
+        self,
+        name,
+        image,
+        env=None,
+        ports=None,
+        skip_ip=False,
+        cpu=0.1,
+        memory=768,
+        healthcheck=None,
+    ):
+        port = self.cluster.call("run", name, image, env)
+        return "127.0.0.1", {
+            container_port: port
+            for container_port in ports or {}
+            if container_port in SERVED_PORTS
+        }
+
+    def wait_healthy(self, name, timeout=None):
+        return True
+
+    def stop(self, name):
+        if self.cluster.call("stop", name):
+            print(f"- stopped {name}")
+
+    def download(self, name, src_path, dst_path):
+        start = time()
+        files = self.cluster.call("list", name, src_path)
+        # laid out like an extracted archive of the source directory
+        parent = os.path.dirname(src_path.rstrip("/"))
+        for path, data in files.items():
+            target = os.path.join(dst_path, os.path.relpath(path, parent))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, "wb") as f:
+                f.write(data)
+        size = sum(map(len, files.values()))
+        elapsed = time() - start
+        print(f"- downloaded {name}:{src_path} ({format_transfer(size, elapsed)})")
+
+    def peek(self, name, path):
+        return self.cluster.call("read", name, path).decode()
+
+    def tail(self, name, path, offset=0):
+        return self.cluster.call("read", name, path)[offset:]
+
+    def upload(self, name, src_path, dst_path):
+        with open(src_path, "rb") as f:
+            self.cluster.call("write", name, dst_path, f.read())
+
+    def cleanup(self, image_prefix=""):
+        self.cluster.call("reset")
+
+    def stats(self):
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        return {
+            "manager_cpu": usage.ru_utime + usage.ru_stime,
+            "manager_max_rss": usage.ru_maxrss * 1024,
+            "mock": self.cluster.call("stats"),
+        }
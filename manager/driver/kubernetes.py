@@ -1,20 +1,192 @@
 from functools import cached_property
-from io import BytesIO
+from multiprocessing.pool import ThreadPool
+import json
 import os
 import tarfile
-from time import sleep
-from . import Driver
-from kubernetes import client, config
+import threading
+from time import sleep, time
+from . import Driver, StreamFollower, follow_command
+from ..utils import extract_stream, format_transfer
+from kubernetes import client, config, watch
 from kubernetes.stream import stream
 from kubernetes.client.exceptions import ApiException
+from kubernetes.utils import parse_quantity
+from websocket import ABNF, WebSocketTimeoutException
+
+STDOUT_CHANNEL = 1
+STDERR_CHANNEL = 2
+ERROR_CHANNEL = 3
+CHUNK_SIZE = 64 * 1024
+STDERR_LIMIT = 4096
+# longest silence of a finite exec before it is considered stalled
+READ_TIMEOUT = 60
+HEADLESS_SERVICE = "coinjoin-pods"
+STARTUP_PROBE_THRESHOLD = 300
+SCHEDULE_TIMEOUT = 300
+# waiting reasons from which a pod does not recover on its own
+TERMINAL_REASONS = ("ErrImagePull", "ImagePullBackOff", "InvalidImageName")
+
+
+class ExecStream:
+    def __init__(self, resp):
+        self.resp = resp
+        self.status = None
+        self.stderr = b""
+
+    def frames(self):
+        # WSClient.update decodes frames as UTF-8, read the raw frames instead
+        while self.resp.is_open():
+            opcode, frame = self.resp.sock.recv_data_frame(True)
+            if opcode == ABNF.OPCODE_CLOSE:
+                self.resp.close()
+                return
+            if opcode not in (ABNF.OPCODE_BINARY, ABNF.OPCODE_TEXT):
+                continue
+            if len(frame.data) < 2:
+                continue
+            channel, data = frame.data[0], frame.data[1:]
+            if channel == STDOUT_CHANNEL:
+                yield data
+            elif channel == STDERR_CHANNEL:
+                self.stderr = (self.stderr + data)[-STDERR_LIMIT:]
+            elif channel == ERROR_CHANNEL:
+                self.status = json.loads(data)
+
+    def stdout(self, timeout=None):
+        self.resp.sock.settimeout(timeout)
+        try:
+            yield from self.frames()
+        except WebSocketTimeoutException:
+            raise TimeoutError(f"no output within {timeout} seconds") from None
+        finally:
+            self.close()
+
+    def write(self, data):
+        for idx in range(0, len(data), CHUNK_SIZE):
+            self.resp.write_stdin(bytes(data[idx : idx + CHUNK_SIZE]))
+
+    def wait(self, timeout=None):
+        self.resp.sock.settimeout(timeout)
+        try:
+            for _ in self.frames():
+                pass
+        except WebSocketTimeoutException:
+            # the command may still be running, it has not reported its status
+            raise TimeoutError(f"no exit status within {timeout} seconds") from None
+
+    def check(self):
+        if self.status is not None and self.status.get("status") != "Success":
+            raise Exception(
+                self.status.get("message") or self.stderr.decode(errors="replace")
+            )
+
+    def close(self):
+        self.resp.close()
+
+
+class PodWatcher:
+    # one watch stream tracks IPs and readiness of every pod in the namespace
+    def __init__(self, configuration, namespace, timeout=300):
+        # own API client, the stream helper patches the request method of its client
+        self.client = client.CoreV1Api(client.ApiClient(configuration))
+        self.namespace = namespace
+        self.timeout = timeout
+        self.pods = {}
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._watch, daemon=True)
+        self._thread.start()
+        return self
+
+    def _watch(self):
+        resource_version = None
+        while True:
+            pod_watch = watch.Watch()
+            try:
+                for event in pod_watch.stream(
+                    self.client.list_namespaced_pod,
+                    self.namespace,
+                    resource_version=resource_version,
+                    timeout_seconds=self.timeout,
+                ):
+                    pod = event["object"]
+                    with self._condition:
+                        if event["type"] == "DELETED":
+                            self.pods.pop(pod.metadata.name, None)
+                        else:
+                            self.pods[pod.metadata.name] = pod
+                        self._condition.notify_all()
+                resource_version = pod_watch.resource_version
+            except ApiException as e:
+                # the resource version expired, start over with a fresh list
+                if e.status == 410:
+                    resource_version = None
+                else:
+                    sleep(1)
+            except Exception:
+                sleep(1)
+
+    def _wait(self, name, check, uid=None, timeout=None):
+        # check returns None until the pod reaches a decisive state
+        def result():
+            pod = self.pods.get(name)
+            if pod is None or (uid is not None and pod.metadata.uid != uid):
+                return None
+            value = check(pod)
+            return None if value is None else (value,)
+
+        with self._condition:
+            found = self._condition.wait_for(result, timeout)
+        return found[0] if found else None
+
+    def wait_ip(self, name, uid=None, timeout=SCHEDULE_TIMEOUT):
+        def check(pod):
+            if pod.status.phase in ("Succeeded", "Failed"):
+                raise Exception(f"pod {name} terminated ({pod.status.phase})")
+            for status in pod.status.container_statuses or []:
+                waiting = status.state and status.state.waiting
+                if waiting and waiting.reason in TERMINAL_REASONS:
+                    raise Exception(f"pod {name} cannot start ({waiting.reason})")
+            return pod.status.pod_ip
+
+        pod_ip = self._wait(name, check, uid, timeout)
+        if pod_ip is None:
+            raise TimeoutError(f"pod {name} got no IP within {timeout} seconds")
+        return pod_ip
+
+    def wait_ready(self, name, timeout=None):
+        def check(pod):
+            if pod.status.phase in ("Succeeded", "Failed"):
+                return False
+            for condition in pod.status.conditions or []:
+                if condition.type == "Ready" and condition.status == "True":
+                    return True
+            return None
+
+        return self._wait(name, check, timeout=timeout) is True
 
 
 class KubernetesDriver(Driver):
-    def __init__(self, namespace="coinjoin", reuse_namespace=False):
-        config.load_kube_config()
-        self.client = client.CoreV1Api()
+    # pods are scheduled by the cluster, the manager host only issues API calls
+    bulk_run = True
+
+    def __init__(
+        self,
+        namespace="coinjoin",
+        reuse_namespace=False,
+        compress=False,
+        api_client=None,
+        services=True,
+    ):
+        if api_client is None:
+            config.load_kube_config()
+        self.client = client.CoreV1Api(api_client)
         self._namespace = namespace
         self.reuse_namespace = reuse_namespace
+        self.compress = compress
+        self.services = services
 
     @cached_property
     def namespace(self):
@@ -30,12 +202,37 @@ class KubernetesDriver(Driver):
     def has_image(self, name):
         return True
 
-    def build(self, name, path):
+    def build(self, name, path, buildargs=None):
         pass
 
     def pull(self, name):
         pass
 
+    @cached_property
+    def headless_service(self):
+        # one service for DNS names of all pods instead of a NodePort per pod
+        service_manifest = {
+            "apiVersion": "v1",
+            "kind": "Service",
+            "metadata": {"name": HEADLESS_SERVICE},
+            "spec": {
+                "clusterIP": "None",
+                "selector": {"service": HEADLESS_SERVICE},
+            },
+        }
+        try:
+            self.client.create_namespaced_service(
+                body=service_manifest, namespace=self.namespace
+            )
+        except ApiException as e:
+            if e.status != 409:
+                raise
+        return HEADLESS_SERVICE
+
+    @cached_property
+    def watcher(self):
+        return PodWatcher(self.client.api_client.configuration, self.namespace).start()
+
     def run(
         self,
         name,
@@ -45,12 +242,60 @@ class KubernetesDriver(Driver):
         skip_ip=False,
         cpu=0.1,
         memory=768,
+        healthcheck=None,
+    ):
+        uid = self._create_pod(name, image, env, ports, cpu, memory, healthcheck)
+        pod_ip = None if skip_ip else self.watcher.wait_ip(name, uid)
+        return pod_ip or "", self._create_service(name, ports)
+
+    def run_many(self, containers, workers=32):
+        # create everything at once, then collect the IPs from the single watch
+        def create(container):
+            try:
+                container = dict(container)
+                name = container.pop("name")
+                skip_ip = container.pop("skip_ip", False)
+                uid = self._create_pod(name, **container)
+                port_mapping = self._create_service(name, container.get("ports"))
+                return name, uid, skip_ip, port_mapping
+            except Exception as e:
+                return e
+
+        with ThreadPool(workers) as pool:
+            created = pool.map(create, containers)
+        # one deadline for all pods, they are scheduled concurrently
+        deadline = time() + SCHEDULE_TIMEOUT
+        results = []
+        for result in created:
+            if isinstance(result, Exception):
+                results.append(result)
+                continue
+            name, uid, skip_ip, port_mapping = result
+            try:
+                pod_ip = (
+                    None
+                    if skip_ip
+                    else self.watcher.wait_ip(name, uid, max(0, deadline - time()))
+                )
+                results.append((pod_ip or "", port_mapping))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def _create_pod(
+        self,
+        name,
+        image,
+        env=None,
+        ports=None,
+        cpu=0.1,
+        memory=768,
+        healthcheck=None,
     ):
         if ports is None:
             ports = {}
         if env is None:
             env = {}
-
         pod_manifest = {
             "apiVersion": "v1",
             "kind": "Pod",
@@ -99,19 +344,36 @@ class KubernetesDriver(Driver):
                 ],
             },
         }
+        if not self.services:
+            pod_manifest["metadata"]["labels"]["service"] = self.headless_service
+            pod_manifest["spec"]["hostname"] = name
+            pod_manifest["spec"]["subdomain"] = self.headless_service
+        if healthcheck:
+            # probed every second until the first success, like --start-interval
+            pod_manifest["spec"]["containers"][0]["startupProbe"] = {
+                "exec": {"command": healthcheck},
+                "periodSeconds": 1,
+                "timeoutSeconds": 3,
+                "failureThreshold": STARTUP_PROBE_THRESHOLD,
+            }
+            pod_manifest["spec"]["containers"][0]["readinessProbe"] = {
+                "exec": {"command": healthcheck},
+                "periodSeconds": 5,
+                "timeoutSeconds": 3,
+                "failureThreshold": 3,
+            }
 
         resp = self.client.create_namespaced_pod(
             body=pod_manifest, namespace=self.namespace
         )
+        return resp.metadata.uid
 
-        pod_ip = None
-        if not skip_ip:
-            while pod_ip is None:
-                pod_ip = self.client.read_namespaced_pod_status(
-                    name=name, namespace=self.namespace
-                ).status.pod_ip
-                sleep(1)
-
+    def _create_service(self, name, ports):
+        if ports is None:
+            ports = {}
+        if not self.services:
+            # pods are reached directly at their container ports
+            return {port: port for port in ports}
         service_manifest = {
             "apiVersion": "v1",
             "kind": "Service",
@@ -137,97 +399,131 @@ class KubernetesDriver(Driver):
         port_mapping = dict(
             map(lambda x: (x.target_port, x.node_port), resp.spec.ports)
         )
-        return pod_ip or "", port_mapping
+        return port_mapping
+
+    def wait_healthy(self, name, timeout=None):
+        return self.watcher.wait_ready(name, timeout)
+
+    @cached_property
+    def supports_sampling(self):
+        # the metrics API is served only when the metrics server is installed
+        groups = client.ApisApi(self.client.api_client).get_api_versions().groups
+        return any(group.name == "metrics.k8s.io" for group in groups)
+
+    def sample(self):
+        # the metrics API reports CPU and memory only, no network or block I/O
+        metrics = client.CustomObjectsApi(
+            self.client.api_client
+        ).list_namespaced_custom_object(
+            "metrics.k8s.io", "v1beta1", self.namespace, "pods"
+        )
+        samples = {}
+        for pod in metrics.get("items", []):
+            usage = [container["usage"] for container in pod.get("containers", [])]
+            samples[pod["metadata"]["name"]] = {
+                "cpu": float(sum(parse_quantity(u["cpu"]) for u in usage)),
+                "memory": int(sum(parse_quantity(u["memory"]) for u in usage)),
+            }
+        return samples
 
     def stop(self, name):
         try:
             self.client.delete_namespaced_pod(name=name, namespace=self.namespace)
-            self.client.delete_namespaced_service(
-                f"{name}-service", namespace=self.namespace
-            )
+            if self.services:
+                self.client.delete_namespaced_service(
+                    f"{name}-service", namespace=self.namespace
+                )
         except:
             pass
 
+    def _exec(self, name, command, stdin=False):
+        return ExecStream(
+            stream(
+                self.client.connect_get_namespaced_pod_exec,
+                name,
+                self.namespace,
+                command=command,
+                stderr=True,
+                stdin=stdin,
+                stdout=True,
+                tty=False,
+                _preload_content=False,
+            )
+        )
+
     def download(self, name, src_path, dst_path):
         if src_path[-1] == "/":
             src_path = src_path[:-1]
         src_parent, src_target = os.path.split(src_path)
-        exec_command = ["tar", "cf", "-", "-C", src_parent, src_target]
-        resp = stream(
-            self.client.connect_get_namespaced_pod_exec,
-            name,
-            self.namespace,
-            command=exec_command,
-            stderr=True,
-            stdin=True,
-            stdout=True,
-            tty=False,
-            _preload_content=False,
-        )
-
-        fo = BytesIO()
-        while resp.is_open():
-            resp.update(timeout=1)
-            if resp.peek_stdout():
-                fo.write(resp.read_stdout().encode())
-        fo.seek(0)
-        with tarfile.open(fileobj=fo) as tar:
-            tar.extractall(dst_path)
-        resp.close()
+        exec_command = [
+            "tar",
+            "czf" if self.compress else "cf",
+            "-",
+            "-C",
+            src_parent,
+            src_target,
+        ]
+        start = time()
+        exec_stream = self._exec(name, exec_command)
+        try:
+            size = extract_stream(
+                exec_stream.stdout(READ_TIMEOUT),
+                dst_path,
+                mode="r|gz" if self.compress else "r|",
+            )
+            exec_stream.check()
+        finally:
+            exec_stream.close()
+        elapsed = time() - start
+        print(f"- downloaded {name}:{src_path} ({format_transfer(size, elapsed)})")
 
     def peek(self, name, path):
-        exec_command = ["cat", path]
-        resp = stream(
-            self.client.connect_get_namespaced_pod_exec,
-            name,
-            self.namespace,
-            command=exec_command,
-            stderr=True,
-            stdin=True,
-            stdout=True,
-            tty=False,
-            _preload_content=False,
-        )
+        exec_stream = self._exec(name, ["cat", path])
+        try:
+            output = b"".join(exec_stream.stdout(READ_TIMEOUT))
+            exec_stream.check()
+        finally:
+            exec_stream.close()
+        return output.decode()
 
-        output = ""
-        while resp.is_open():
-            resp.update(timeout=1)
-            if resp.peek_stdout():
-                output += resp.read_stdout()
-        resp.close()
+    def tail(self, name, path, offset=0):
+        exec_stream = self._exec(name, ["tail", "-c", f"+{offset + 1}", path])
+        try:
+            output = b"".join(exec_stream.stdout(READ_TIMEOUT))
+            exec_stream.check()
+        finally:
+            exec_stream.close()
         return output
 
-    def upload(self, name, src_path, dst_path):
-        buf = BytesIO()
-        with tarfile.open(fileobj=buf, mode="w:tar") as tar:
-            tar.add(src_path, arcname=dst_path)
-        commands = [buf.getvalue()]
-
-        exec_command = ["tar", "xf", "-", "-C", "/"]
-        resp = stream(
-            self.client.connect_get_namespaced_pod_exec,
+    def follow(self, name, path):
+        return StreamFollower(
+            self,
             name,
-            self.namespace,
-            command=exec_command,
-            stderr=True,
-            stdin=True,
-            stdout=True,
-            tty=False,
-            _preload_content=False,
+            path,
+            lambda offset: self._exec(name, follow_command(path, offset)).stdout(),
+            lambda pid: self._kill(name, pid),
         )
 
-        while resp.is_open():
-            resp.update(timeout=1)
-            if resp.peek_stdout():
-                print(f"STDOUT: {resp.read_stdout()}")
-            if resp.peek_stderr():
-                print(f"STDERR: {resp.read_stderr()}")
-            if commands:
-                c = commands.pop(0)
-                resp.write_stdin(c)
-            else:
-                break
-        resp.close()
+    def _kill(self, name, pid):
+        exec_stream = self._exec(name, ["kill", str(pid)])
+        try:
+            exec_stream.wait(timeout=10)
+            exec_stream.check()
+        finally:
+            exec_stream.close()
+
+    def upload(self, name, src_path, dst_path):
+        exec_stream = self._exec(name, ["tar", "xf", "-", "-C", "/"], stdin=True)
+        try:
+            with tarfile.open(
+                fileobj=exec_stream, mode="w|", bufsize=CHUNK_SIZE
+            ) as tar:
+                tar.add(src_path, arcname=dst_path)
+            # tar exits at the end-of-archive marker, stdin cannot be half-closed
+            exec_stream.wait(timeout=60)
+            exec_stream.check()
+        finally:
+            exec_stream.close()
 
     def cleanup(self, image_prefix=""):
         pods = self.client.list_namespaced_pod(namespace=self._namespace)
@@ -246,7 +542,12 @@ class KubernetesDriver(Driver):
         for service in services.items:
             if any(
                 x in service.metadata.name
-                for x in ("btc-node", "wasabi-backend", "wasabi-client")
+                for x in (
+                    "btc-node",
+                    "wasabi-backend",
+                    "wasabi-client",
+                    HEADLESS_SERVICE,
+                )
             ):
                 try:
                     self.client.delete_namespaced_service(
@@ -1,12 +1,26 @@
+from functools import cached_property
 from io import BytesIO
 import os
 import tarfile
-from . import Driver
+from time import time
+from . import Driver, StreamFollower
+from ..utils import extract_stream, read_stream_file, format_transfer
+from .docker import (
+    CPU_PERIOD,
+    STATS_POOL_SIZE,
+    StatsStreams,
+    exec_tail,
+    exec_follow,
+    exec_kill,
+    wait_container_healthy,
+)
 import podman
 import docker
 
 
 class PodmanDriver(Driver):
+    supports_sampling = True
+
     def __init__(self):
         self.client = podman.PodmanClient()
 
@@ -17,8 +31,10 @@ class PodmanDriver(Driver):
         except docker.errors.ImageNotFound:
             return False
 
-    def build(self, name, path):
-        docker.from_env().images.build(path=path, tag=name, rm=True, nocache=True)
+    def build(self, name, path, buildargs=None):
+        docker.from_env().images.build(
+            path=path, tag=name, rm=True, nocache=True, buildargs=buildargs
+        )
 
     def pull(self, name):
         docker.from_env().images.pull(name)
@@ -32,6 +48,7 @@ class PodmanDriver(Driver):
         skip_ip=False,
         cpu=0.1,
         memory=768,
+        healthcheck=None,
     ):
         self.client.containers.run(
             image,
@@ -41,9 +58,34 @@ class PodmanDriver(Driver):
             hostname=name,
             ports=ports or {},
             environment=env or {},
+            cpu_period=CPU_PERIOD,
+            cpu_quota=int(cpu * CPU_PERIOD),
+            mem_limit=f"{memory}m",
         )
         return "", ports
 
+    def wait_healthy(self, name, timeout=None):
+        return wait_container_healthy(
+            lambda: docker.from_env().containers.get(name), timeout
+        )
+
+    @cached_property
+    def stats_streams(self):
+        client = docker.from_env(max_pool_size=STATS_POOL_SIZE)
+        return StatsStreams(
+            lambda: [
+                container
+                for container in client.containers.list()
+                if any(
+                    x in container.attrs["Config"]["Image"]
+                    for x in ("btc-node", "wasabi-backend", "wasabi-client")
+                )
+            ]
+        )
+
+    def sample(self):
+        return self.stats_streams.sample()
+
     def stop(self, name):
         try:
             self.client.containers.get(name).stop()
@@ -52,29 +94,29 @@ class PodmanDriver(Driver):
             pass
 
     def download(self, name, src_path, dst_path):
-        try:
-            stream, _ = docker.from_env().containers.get(name).get_archive(src_path)
-
-            fo = BytesIO()
-            for d in stream:
-                fo.write(d)
-            fo.seek(0)
-            with tarfile.open(fileobj=fo) as tar:
-                tar.extractall(dst_path)
-
-            print(f"- stored backend logs")
-        except:
-            print(f"- could not store backend logs")
+        start = time()
+        stream, _ = docker.from_env().containers.get(name).get_archive(src_path)
+        size = extract_stream(stream, dst_path)
+        elapsed = time() - start
+        print(f"- downloaded {name}:{src_path} ({format_transfer(size, elapsed)})")
 
     def peek(self, name, path):
         stream, _ = docker.from_env().containers.get(name).get_archive(path)
+        return read_stream_file(stream, os.path.basename(path)).decode()
 
-        fo = BytesIO()
-        for d in stream:
-            fo.write(d)
-        fo.seek(0)
-        with tarfile.open(fileobj=fo) as tar:
-            return tar.extractfile(os.path.basename(path)).read().decode()
+    def tail(self, name, path, offset=0):
+        return exec_tail(docker.from_env().containers.get(name), path, offset)
+
+    def follow(self, name, path):
+        return StreamFollower(
+            self,
+            name,
+            path,
+            lambda offset: exec_follow(
+                docker.from_env().containers.get(name), path, offset
+            ),
+            lambda pid: exec_kill(docker.from_env().containers.get(name), pid),
+        )
 
     def upload(self, name, src_path, dst_path):
         fo = BytesIO()
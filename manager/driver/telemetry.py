@@ -0,0 +1,93 @@
+import csv
+import os
+import re
+import threading
+from time import time
+from ..utils import percentile
+
+FIELDS = ("cpu", "memory", "net_rx", "net_tx", "block_read", "block_write")
+
+
+def container_kind(name):
+    return re.sub(r"-\d+$", "", name)
+
+
+def format_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        return f"{value:.3f}"
+    return str(value)
+
+
+class ResourceSampler:
+    # appends the resource usage of all containers to a CSV time series
+    def __init__(self, sample, path, interval=10):
+        self.sample = sample
+        self.path = path
+        self.interval = interval
+        self.samples = 0
+        self.errors = 0
+        self.peaks = {}
+        self.started = time()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def _record(self, writer, samples):
+        now = f"{time() - self.started:.1f}"
+        for name, usage in sorted(samples.items()):
+            writer.writerow(
+                (now, name, *(format_value(usage.get(field)) for field in FIELDS))
+            )
+            cpu, memory = self.peaks.get(name, (0.0, 0))
+            self.peaks[name] = (
+                max(cpu, usage.get("cpu") or 0.0),
+                max(memory, usage.get("memory") or 0),
+            )
+
+    def _run(self):
+        with open(self.path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(("time", "container", *FIELDS))
+            while not self._stopped.wait(self.interval):
+                try:
+                    samples = self.sample()
+                except Exception as e:
+                    if not self.errors:
+                        print(f"- could not sample container resources ({e})")
+                    self.errors += 1
+                    continue
+                self._record(writer, samples)
+                f.flush()
+                self.samples += 1
+
+    def start(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        # no container reported its usage, leave no empty time series behind
+        if not self.peaks and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def summary(self):
+        # per kind of container, the largest and the p95 of the per-container peaks
+        kinds = {}
+        for name, peak in self.peaks.items():
+            kinds.setdefault(container_kind(name), []).append(peak)
+        lines = []
+        for kind, peaks in sorted(kinds.items()):
+            cpus = [cpu for cpu, _ in peaks]
+            memories = [memory for _, memory in peaks]
+            lines.append(
+                f"{kind} ({len(peaks)}): peak CPU {max(cpus):.2f} "
+                f"(p95 {percentile(cpus, 95):.2f}), "
+                f"peak memory {max(memories) / 2**20:.0f} MiB "
+                f"(p95 {percentile(memories, 95) / 2**20:.0f} MiB)"
+            )
+        return lines
@@ -0,0 +1,108 @@
+import copy
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from manager.rpc_metrics import BUCKETS, Histogram
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Histograms:
+    def __init__(self):
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, key, seconds):
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def snapshot(self):
+        with self._lock:
+            return copy.deepcopy(self._histograms)
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    pairs = (f'{key}="{escape(value)}"' for key, value in labels.items())
+    return "{" + ",".join(pairs) + "}"
+
+
+def format_bound(bound):
+    return "+Inf" if bound == float("inf") else repr(bound)
+
+
+class Exposition:
+    # builds the Prometheus text exposition format, one family at a time
+    def __init__(self):
+        self.lines = []
+
+    def family(self, name, kind, help, samples):
+        self.lines.append(f"# HELP {name} {help}")
+        self.lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            self.lines.append(f"{name}{format_labels(labels)} {value}")
+
+    def histogram(self, name, help, histograms, label):
+        self.lines.append(f"# HELP {name} {help}")
+        self.lines.append(f"# TYPE {name} histogram")
+        for key, histogram in sorted(histograms.items()):
+            labels = {label: key} if label else {}
+            cumulative = 0
+            for bound, count in zip(BUCKETS, histogram.counts):
+                cumulative += count
+                bucket = format_labels({**labels, "le": format_bound(bound)})
+                self.lines.append(f"{name}_bucket{bucket} {cumulative}")
+            self.lines.append(f"{name}_sum{format_labels(labels)} {histogram.sum}")
+            self.lines.append(f"{name}_count{format_labels(labels)} {histogram.count}")
+
+    def text(self):
+        return "\n".join(self.lines) + "\n"
+
+
+class MetricsServer:
+    # serves the metrics collected on every scrape, only on the loopback by default
+    def __init__(self, collect, host="127.0.0.1", port=9100):
+        self.collect = collect
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                try:
+                    exposition = Exposition()
+                    server.collect(exposition)
+                    data = exposition.text().encode()
+                except Exception as e:
+                    self.send_error(500, str(e))
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.host, self.port = self.httpd.server_address[:2]
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
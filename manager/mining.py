@@ -0,0 +1,77 @@
+import re
+from time import time
+
+TIMESPAN = re.compile(r"^\s*(\d+)d\s+(\d+)h\s+(\d+)m\s+(\d+)s\s*$")
+
+
+def parse_timespan(value):
+    match = TIMESPAN.match(value)
+    if match is None:
+        raise ValueError(f"invalid timespan '{value}'")
+    days, hours, minutes, seconds = map(int, match.groups())
+    return ((days * 24 + hours) * 60 + minutes) * 60 + seconds
+
+
+def format_timespan(seconds):
+    seconds = max(1, round(seconds))
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    days, hours = divmod(hours, 24)
+    return f"{days}d {hours}h {minutes}m {seconds}s"
+
+
+def scale_timeouts(config, factor):
+    scaled = dict(config)
+    for key, value in config.items():
+        if key.endswith("Timeout") and isinstance(value, str):
+            scaled[key] = format_timespan(parse_timespan(value) / factor)
+    return scaled
+
+
+class MiningPolicy:
+    def __init__(
+        self, node, policy="interval", interval=60, delay=5, max_interval=None
+    ):
+        if policy not in ("interval", "after_coinjoin"):
+            raise ValueError(f"unknown mining policy '{policy}'")
+        self.node = node
+        self.policy = policy
+        self.interval = interval
+        self.delay = delay
+        self.max_interval = max_interval or interval
+        self.mined = 0
+        self.last_block = time()
+        self.last_round = 0
+        self.pending = None
+
+    @classmethod
+    def from_scenario(cls, node, config, factor=1):
+        return cls(
+            node,
+            policy=config.get("policy", "interval"),
+            interval=config.get("interval", 60 / factor),
+            delay=config.get("delay", 5),
+            max_interval=config.get("max_interval"),
+        )
+
+    def due(self, current_round, now):
+        if self.policy == "after_coinjoin":
+            if current_round > self.last_round:
+                self.last_round = current_round
+                if self.pending is None:
+                    self.pending = now + self.delay
+            if self.pending is not None and now >= self.pending:
+                return True
+            return now - self.last_block >= self.max_interval
+        return now - self.last_block >= self.interval
+
+    def update(self, current_round):
+        now = time()
+        if not self.due(current_round, now):
+            return False
+        if not self.node.mine_block():
+            return False
+        self.mined += 1
+        self.last_block = now
+        self.pending = None
+        return True
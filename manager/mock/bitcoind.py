@@ -0,0 +1,95 @@
+import asyncio
+import hashlib
+import itertools
+
+BTC = 100_000_000
+INITIAL_BLOCKS = 201
+
+
+def digest(*parts):
+    return hashlib.sha256(":".join(map(str, parts)).encode()).hexdigest()
+
+
+class MockBitcoind:
+    # regtest chain and ledger shared by every mocked wallet
+    null_error = True
+
+    def __init__(self, blocks=INITIAL_BLOCKS, block_interval=0):
+        self.blocks = []
+        self.mempool = []
+        self.owners = {}
+        self.files = {}
+        self.block_interval = block_interval
+        self.mining = True
+        self._ids = itertools.count()
+        self.mine(blocks)
+
+    def new_address(self, owner=None):
+        address = "bcrt1q" + digest("address", next(self._ids))[:38]
+        if owner is not None:
+            self.owners[address] = owner
+        return address
+
+    def transfer(self, outputs):
+        # outputs maps addresses to satoshis, wallets see their coins at once
+        txid = digest("tx", next(self._ids))
+        for index, (address, amount) in enumerate(outputs.items()):
+            owner = self.owners.get(address)
+            if owner is not None:
+                owner.receive(txid, index, address, amount)
+        self.mempool.append(
+            {
+                "txid": txid,
+                "vout": [
+                    {"n": index, "value": amount / BTC, "address": address}
+                    for index, (address, amount) in enumerate(outputs.items())
+                ],
+            }
+        )
+        return txid
+
+    def mine(self, count=1):
+        hashes = []
+        for _ in range(count):
+            height = len(self.blocks)
+            self.blocks.append(
+                {"hash": digest("block", height), "height": height, "tx": self.mempool}
+            )
+            self.mempool = []
+            hashes.append(self.blocks[-1]["hash"])
+        return hashes
+
+    def get_block(self, block_hash, verbosity=1):
+        for block in reversed(self.blocks):
+            if block["hash"] == block_hash:
+                if verbosity < 2:
+                    return {**block, "tx": [tx["txid"] for tx in block["tx"]]}
+                return block
+        raise Exception("Block not found")
+
+    def methods(self, path=""):
+        return {
+            "getblockcount": lambda: len(self.blocks) - 1,
+            "getblockhash": lambda height: self.blocks[height]["hash"],
+            "getblock": self.get_block,
+            "getnewaddress": lambda *_: self.new_address(),
+            "generatetoaddress": lambda count, *_: self.mine(count),
+            "sendtoaddress": lambda address, amount, *_: self.transfer(
+                {address: round(amount * BTC)}
+            ),
+            "sendmany": lambda _, amounts, *__: self.transfer(
+                {address: round(amount * BTC) for address, amount in amounts.items()}
+            ),
+            "createwallet": lambda *_: {},
+            "loadwallet": lambda *_: {},
+        }
+
+    def get(self, path):
+        return {}
+
+    async def run(self):
+        # the btc-node image mines on its own unless DISABLE_MINER is set
+        while self.block_interval:
+            await asyncio.sleep(self.block_interval)
+            if self.mining:
+                self.mine()
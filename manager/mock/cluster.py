@@ -0,0 +1,166 @@
+import asyncio
+import json
+import os
+import resource
+from manager.utils import raise_nofile_limit
+from manager.mock.bitcoind import MockBitcoind
+from manager.mock.rpc_server import dispatch
+from manager.mock.wasabi import MockWasabiBackend, MockWasabiClient
+
+# idle keep-alive connections are closed, otherwise every client holds one
+IDLE_TIMEOUT = 5
+
+
+class MockCluster:
+    # one listening port per container, all served by a single event loop
+    def __init__(
+        self, latency=0.0, failure_rate=0.0, round_interval=10, block_interval=10
+    ):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.round_interval = round_interval
+        self.chain = MockBitcoind(block_interval=block_interval)
+        self.containers = {}
+        self.servers = {}
+        self.tasks = {}
+        self.requests = 0
+        self.rpcs = 0
+        self.errors = 0
+
+    def service(self, image, env):
+        if "btc-node" in image:
+            self.chain.mining = not (env or {}).get("DISABLE_MINER")
+            return self.chain
+        if "wasabi-backend" in image:
+            return MockWasabiBackend(self.mixing, self.round_interval)
+        if "wasabi-client" in image:
+            return MockWasabiClient(self.chain)
+        raise Exception(f"Unknown image {image}")
+
+    def mixing(self):
+        return any(
+            service.mixing()
+            for service in self.containers.values()
+            if isinstance(service, MockWasabiClient)
+        )
+
+    async def run(self, name, image, env=None):
+        await self.stop(name)
+        service = self.service(image, env)
+        server = await asyncio.start_server(
+            lambda reader, writer: self._serve(service, reader, writer),
+            "127.0.0.1",
+            0,
+        )
+        self.containers[name] = service
+        self.servers[name] = server
+        self.tasks[name] = asyncio.ensure_future(service.run())
+        return server.sockets[0].getsockname()[1]
+
+    async def stop(self, name):
+        if name not in self.containers:
+            return False
+        self.containers.pop(name)
+        self.tasks.pop(name).cancel()
+        server = self.servers.pop(name)
+        server.close()
+        await server.wait_closed()
+        return True
+
+    async def reset(self):
+        for name in list(self.containers):
+            await self.stop(name)
+
+    async def _serve(self, service, reader, writer):
+        try:
+            while True:
+                line = await asyncio.wait_for(reader.readline(), IDLE_TIMEOUT)
+                if not line:
+                    break
+                method, target, _ = line.decode().split(" ", 2)
+                headers = {}
+                while (header := await reader.readline()).strip():
+                    key, _, value = header.decode().partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                data = json.dumps(self._handle(service, method, target, body)).encode()
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    b"Content-Length: %d\r\n\r\n" % len(data) + data
+                )
+                await writer.drain()
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except ValueError:
+            # not HTTP, e.g. a ZMQ handshake, or a malformed request
+            pass
+        finally:
+            writer.close()
+
+    def _handle(self, service, method, target, body):
+        self.requests += 1
+        path = target.strip("/")
+        if method != "POST":
+            return service.get(path)
+        request = json.loads(body)
+        response = dispatch(
+            service.methods(path), request, service.null_error, self.failure_rate
+        )
+        responses = response if isinstance(response, list) else [response]
+        self.rpcs += len(responses)
+        self.errors += sum(1 for r in responses if r.get("error") is not None)
+        return response
+
+    def read(self, name, path):
+        data = self.containers[name].files.get(path)
+        if data is None:
+            raise FileNotFoundError(f"{name}:{path}")
+        return bytes(data)
+
+    def list(self, name, path):
+        return {
+            file: bytes(data)
+            for file, data in self.containers[name].files.items()
+            if file.startswith(path)
+        }
+
+    def write(self, name, path, data):
+        self.containers[name].files[path] = bytearray(data)
+
+    def stats(self):
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        return {
+            "containers": len(self.containers),
+            "requests": self.requests,
+            "rpcs": self.rpcs,
+            "errors": self.errors,
+            "blocks": len(self.chain.blocks),
+            "cpu": usage.ru_utime + usage.ru_stime,
+            "max_rss": usage.ru_maxrss * 1024,
+        }
+
+
+async def control(conn, cluster):
+    loop = asyncio.get_running_loop()
+    while True:
+        command, *params = await loop.run_in_executor(None, conn.recv)
+        if command == "shutdown":
+            await cluster.reset()
+            conn.send((True, None))
+            return
+        try:
+            result = getattr(cluster, command)(*params)
+            if asyncio.iscoroutine(result):
+                result = await result
+            conn.send((True, result))
+        except Exception as e:
+            conn.send((False, e))
+
+
+def serve(conn, options):
+    # entry point of the process standing in for all containers of a run
+    raise_nofile_limit()
+    os.setpgrp()
+    asyncio.run(control(conn, MockCluster(**options)))
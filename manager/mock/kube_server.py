@@ -0,0 +1,147 @@
+import base64
+import hashlib
+import json
+import struct
+import subprocess
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+OPCODE_BINARY = 0x2
+OPCODE_CLOSE = 0x8
+OPCODE_PING = 0x9
+OPCODE_PONG = 0xA
+
+
+def encode_frame(opcode, payload):
+    header = bytes([0x80 | opcode])
+    length = len(payload)
+    if length < 126:
+        header += bytes([length])
+    elif length < 2**16:
+        header += bytes([126]) + struct.pack("!H", length)
+    else:
+        header += bytes([127]) + struct.pack("!Q", length)
+    return header + payload
+
+
+def read_frame(rfile):
+    head = rfile.read(2)
+    if len(head) < 2:
+        return OPCODE_CLOSE, b""
+    opcode, length = head[0] & 0x0F, head[1] & 0x7F
+    if length == 126:
+        (length,) = struct.unpack("!H", rfile.read(2))
+    elif length == 127:
+        (length,) = struct.unpack("!Q", rfile.read(8))
+    mask = rfile.read(4) if head[1] & 0x80 else None
+    data = rfile.read(length)
+    if mask and data:
+        key = (mask * (length // 4 + 1))[:length]
+        data = (int.from_bytes(data, "big") ^ int.from_bytes(key, "big")).to_bytes(
+            length, "big"
+        )
+    return opcode, data
+
+
+class KubeExecServer:
+    # stand-in for the pod exec endpoint of the API server, commands run locally
+    def __init__(self, host="127.0.0.1", port=0, frame_size=32 * 1024):
+        self.frame_size = frame_size
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if not url.path.endswith("/exec"):
+                    self.send_error(404)
+                    return
+                query = parse_qs(url.query)
+                key = self.headers["Sec-WebSocket-Key"] + WEBSOCKET_GUID
+                accept = base64.b64encode(hashlib.sha1(key.encode()).digest())
+                self.send_response(101)
+                self.send_header("Upgrade", "websocket")
+                self.send_header("Connection", "Upgrade")
+                self.send_header("Sec-WebSocket-Accept", accept.decode())
+                self.send_header("Sec-WebSocket-Protocol", "v4.channel.k8s.io")
+                self.end_headers()
+                stdin = query.get("stdin", ["false"])[0].lower() == "true"
+                server.exec(self, query["command"], stdin)
+                self.close_connection = True
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.host, self.port = self.httpd.server_address
+        self.thread = None
+
+    def exec(self, handler, command, stdin):
+        lock = threading.Lock()
+
+        def send(opcode, payload):
+            with lock:
+                handler.wfile.write(encode_frame(opcode, payload))
+
+        process = subprocess.Popen(
+            command,
+            stdin=subprocess.PIPE if stdin else subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+
+        def pump(pipe, channel):
+            while chunk := pipe.read1(self.frame_size):
+                send(OPCODE_BINARY, bytes([channel]) + chunk)
+
+        def receive():
+            try:
+                while True:
+                    opcode, data = read_frame(handler.rfile)
+                    if opcode == OPCODE_CLOSE:
+                        break
+                    if opcode == OPCODE_PING:
+                        send(OPCODE_PONG, data)
+                    elif stdin and data and data[0] == 0:
+                        process.stdin.write(data[1:])
+                        process.stdin.flush()
+            except (OSError, ValueError):
+                pass
+            if stdin:
+                try:
+                    process.stdin.close()
+                except (OSError, ValueError):
+                    pass
+
+        pumps = [
+            threading.Thread(target=pump, args=(process.stdout, 1)),
+            threading.Thread(target=pump, args=(process.stderr, 2)),
+        ]
+        for thread in pumps:
+            thread.start()
+        threading.Thread(target=receive, daemon=True).start()
+        for thread in pumps:
+            thread.join()
+        if process.wait() == 0:
+            status = {"metadata": {}, "status": "Success"}
+        else:
+            status = {
+                "metadata": {},
+                "status": "Failure",
+                "message": f"command exited with code {process.returncode}",
+            }
+        send(OPCODE_BINARY, bytes([3]) + json.dumps(status).encode())
+        send(OPCODE_CLOSE, struct.pack("!H", 1000))
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
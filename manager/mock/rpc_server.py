@@ -0,0 +1,93 @@
+import json
+import random
+import threading
+from time import sleep
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def dispatch(methods, request, null_error=True, failure_rate=0.0):
+    # bitcoind always sends "error", Wasabi only when the call failed
+    if isinstance(request, list):
+        return [dispatch(methods, r, null_error, failure_rate) for r in request]
+    response = {"jsonrpc": "2.0", "id": request.get("id")}
+    method = methods.get(request.get("method"))
+    params = request.get("params", [])
+    if isinstance(params, dict):
+        params = [params]
+    try:
+        if method is None:
+            raise LookupError("Method not found")
+        if failure_rate and random.random() < failure_rate:
+            raise Exception("Injected failure")
+        response["result"] = method(*params)
+        if null_error:
+            response["error"] = None
+    except Exception as e:
+        response["result"] = None
+        response["error"] = {
+            "code": -32601 if isinstance(e, LookupError) else -32603,
+            "message": str(e),
+        }
+    return response
+
+
+class JsonRpcServer:
+    def __init__(
+        self,
+        methods=None,
+        host="127.0.0.1",
+        port=0,
+        null_error=True,
+        latency=0.0,
+        failure_rate=0.0,
+    ):
+        self.methods = methods or {}
+        self.null_error = null_error
+        self.latency = latency
+        self.failure_rate = failure_rate
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def _reply(self, code, body):
+                data = json.dumps(body).encode()
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length))
+                if server.latency:
+                    sleep(server.latency)
+                self._reply(200, server.handle(request, self.path))
+
+            def do_GET(self):
+                self._reply(200, server.handle_get(self.path))
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.host, self.port = self.httpd.server_address
+        self.thread = None
+
+    def handle(self, request, path):
+        return dispatch(self.methods, request, self.null_error, self.failure_rate)
+
+    def handle_get(self, path):
+        return {}
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
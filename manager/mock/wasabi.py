@@ -0,0 +1,134 @@
+import asyncio
+from manager.round_counter import COINJOIN_ID_STORE
+
+FEE = 1000
+CLIENT_LOG = "/home/wasabi/.walletwasabi/client/Logs.txt"
+
+
+class MockWallet:
+    def __init__(self, name, chain):
+        self.name = name
+        self.chain = chain
+        self.coins = {}
+        self.spent = []
+        self.keys = []
+        self.mixing = False
+
+    def new_address(self):
+        address = self.chain.new_address(self)
+        self.keys.append(address)
+        return address
+
+    def receive(self, txid, index, address, amount):
+        self.coins[(txid, index)] = {
+            "txid": txid,
+            "index": index,
+            "amount": amount,
+            "address": address,
+            "anonymityScore": 1,
+            "confirmed": False,
+        }
+
+    def send(self, params):
+        coins = []
+        for coin in params.get("coins", []):
+            key = coin["transactionid"], coin["index"]
+            if key not in self.coins:
+                raise Exception("Bad Request")
+            coins.append(key)
+        outputs = {
+            payment["sendto"]: payment["amount"] for payment in params["payments"]
+        }
+        change = sum(self.coins[key]["amount"] for key in coins) - sum(outputs.values())
+        if change < FEE:
+            raise Exception("Insufficient funds")
+        if change > FEE:
+            outputs[self.new_address()] = change - FEE
+        txid = self.chain.transfer(outputs)
+        for key in coins:
+            self.spent.append({**self.coins.pop(key), "spentBy": txid})
+        return {"txid": txid, "tx": ""}
+
+    def methods(self):
+        return {
+            "getwalletinfo": lambda: {
+                "walletName": self.name,
+                "balance": sum(coin["amount"] for coin in self.coins.values()),
+            },
+            "getnewaddress": lambda *_: {"address": self.new_address()},
+            "listkeys": lambda: [{"address": address} for address in self.keys],
+            "listunspentcoins": lambda: list(self.coins.values()),
+            "listcoins": lambda: self.spent + list(self.coins.values()),
+            "send": self.send,
+            "startcoinjoin": lambda *_: setattr(self, "mixing", True),
+            "stopcoinjoin": lambda *_: setattr(self, "mixing", False),
+        }
+
+
+class MockWasabiClient:
+    # wallets are addressed by the URL path, older versions by selectwallet
+    null_error = False
+
+    def __init__(self, chain):
+        self.chain = chain
+        self.wallets = {}
+        self.selected = None
+        self.files = {CLIENT_LOG: bytearray()}
+
+    def log(self, line):
+        self.files[CLIENT_LOG] += f"{line}\n".encode()
+
+    def create_wallet(self, name, *_):
+        if name not in self.wallets:
+            self.wallets[name] = MockWallet(name, self.chain)
+            self.log(f"Wallet {name} created")
+        return {}
+
+    def select_wallet(self, name, *_):
+        if name not in self.wallets:
+            raise Exception(f"Wallet {name} not found")
+        self.selected = name
+
+    def mixing(self):
+        return any(wallet.mixing for wallet in self.wallets.values())
+
+    def methods(self, path=""):
+        methods = {
+            "getstatus": lambda: {"status": "ok"},
+            "createwallet": self.create_wallet,
+            "selectwallet": self.select_wallet,
+        }
+        wallet = self.wallets.get(path or self.selected)
+        if wallet is not None:
+            methods.update(wallet.methods())
+        return methods
+
+    def get(self, path):
+        return {}
+
+    async def run(self):
+        pass
+
+
+class MockWasabiBackend:
+    # a coinjoin round completes every interval while any wallet is mixing
+    null_error = False
+
+    def __init__(self, mixing, round_interval=10):
+        self.mixing = mixing
+        self.round_interval = round_interval
+        self.rounds = 0
+        self.files = {COINJOIN_ID_STORE: bytearray()}
+
+    def methods(self, path=""):
+        return {}
+
+    def get(self, path):
+        return {}
+
+    async def run(self):
+        while self.round_interval:
+            await asyncio.sleep(self.round_interval)
+            if self.mixing():
+                self.rounds += 1
+                self.files[COINJOIN_ID_STORE] += f"{self.rounds:064x}\n".encode()
@@ -0,0 +1,21 @@
+COINJOIN_ID_STORE = "/home/wasabi/.walletwasabi/backend/WabiSabi/CoinJoinIdStore.txt"
+
+
+class RoundCounter:
+    def __init__(self, driver, name="wasabi-backend", path=COINJOIN_ID_STORE):
+        self.driver = driver
+        self.name = name
+        self.path = path
+        self.rounds = 0
+        self.follower = None
+
+    def update(self):
+        if self.follower is None:
+            self.follower = self.driver.follow(self.name, self.path)
+        self.rounds += self.follower.read().count(b"\n")
+        return self.rounds
+
+    def close(self):
+        if self.follower is not None:
+            self.follower.close()
+            self.follower = None
@@ -0,0 +1,138 @@
+import asyncio
+import functools
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+import requests
+from requests.adapters import HTTPAdapter
+from manager.rpc_metrics import RpcMetrics
+
+POOL_MAXSIZE = 32
+POOL_BLOCK = False
+ASYNC_CONCURRENCY = 64
+
+_endpoints = {}
+_lock = threading.Lock()
+_executor = None
+metrics = RpcMetrics()
+
+
+def configure(
+    pool_maxsize=None, pool_block=None, async_concurrency=None, record_metrics=None
+):
+    global POOL_MAXSIZE, POOL_BLOCK, ASYNC_CONCURRENCY, _executor
+    if record_metrics is not None:
+        metrics.enabled = record_metrics
+    if pool_maxsize is not None:
+        POOL_MAXSIZE = pool_maxsize
+    if pool_block is not None:
+        POOL_BLOCK = pool_block
+    if async_concurrency is not None and async_concurrency != ASYNC_CONCURRENCY:
+        ASYNC_CONCURRENCY = async_concurrency
+        with _lock:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+                _executor = None
+
+
+def method_name(payload):
+    if isinstance(payload, dict):
+        return payload.get("method")
+    return f"batch {payload[0].get('method')}" if payload else "batch"
+
+
+def failed(response):
+    if isinstance(response, list):
+        return any(failed(item) for item in response)
+    return isinstance(response, dict) and response.get("error") is not None
+
+
+class Endpoint:
+    def __init__(self, host, port, proxy="", auth=None, name=""):
+        self.base_url = f"http://{host}:{port}"
+        self.name = name or f"{host}:{port}"
+        self.session = requests.Session()
+        self.session.auth = auth
+        self.session.trust_env = False
+        if proxy:
+            self.session.proxies = dict(http=proxy)
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=POOL_MAXSIZE, pool_block=POOL_BLOCK
+        )
+        self.session.mount("http://", adapter)
+
+    def _request(self, method, call):
+        # timeouts are not latencies, they are only counted
+        start = perf_counter()
+        try:
+            response = call().json()
+        except requests.exceptions.Timeout:
+            metrics.observe(self.name, method, 0.0, timeout=True)
+            raise
+        except Exception:
+            metrics.observe(self.name, method, perf_counter() - start, error=True)
+            raise
+        metrics.observe(
+            self.name, method, perf_counter() - start, error=failed(response)
+        )
+        return response
+
+    def post(self, payload, path="", timeout=5):
+        return self._request(
+            method_name(payload),
+            lambda: self.session.post(
+                f"{self.base_url}/{path}",
+                data=json.dumps(payload).encode(),
+                timeout=timeout,
+            ),
+        )
+
+    def get(self, path, timeout=5):
+        return self._request(
+            f"GET {path}",
+            lambda: self.session.get(f"{self.base_url}/{path}", timeout=timeout),
+        )
+
+    def close(self):
+        self.session.close()
+
+
+def endpoint(host, port, proxy="", auth=None, name=""):
+    # the name labels the metrics, a container re-created on the same address
+    # under another name gets its own endpoint
+    key = (host, port, proxy, auth, name)
+    ep = _endpoints.get(key)
+    if ep is None:
+        with _lock:
+            ep = _endpoints.get(key)
+            if ep is None:
+                ep = Endpoint(host, port, proxy, auth, name)
+                _endpoints[key] = ep
+    return ep
+
+
+def executor():
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=ASYNC_CONCURRENCY, thread_name_prefix="rpc"
+                )
+    return _executor
+
+
+async def run_async(func, *args, **kwargs):
+    # blocking calls share one long-lived executor, its size bounds concurrency
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        executor(), functools.partial(func, *args, **kwargs)
+    )
+
+
+def close_all():
+    with _lock:
+        for ep in _endpoints.values():
+            ep.close()
+        _endpoints.clear()
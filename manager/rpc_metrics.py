@@ -0,0 +1,204 @@
+import bisect
+import json
+import os
+import threading
+from time import time
+
+# upper bounds in seconds, the last bucket catches everything slower
+BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    float("inf"),
+)
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        for idx, count in enumerate(other.counts):
+            self.counts[idx] += count
+        self.count += other.count
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q):
+        # the upper bound of the bucket holding the quantile, capped by the maximum
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+
+class MethodStats:
+    def __init__(self):
+        self.latency = Histogram()
+        self.timeouts = 0
+        self.errors = 0
+
+    def merge(self, other):
+        self.latency.merge(other.latency)
+        self.timeouts += other.timeouts
+        self.errors += other.errors
+
+    def to_dict(self, buckets=True):
+        stats = {
+            "calls": self.latency.count,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "sum": self.latency.sum,
+            "max": self.latency.max,
+            "p50": self.latency.quantile(0.5),
+            "p95": self.latency.quantile(0.95),
+            "p99": self.latency.quantile(0.99),
+        }
+        if buckets:
+            stats["buckets"] = dict(zip(map(str, BUCKETS), self.latency.counts))
+        return stats
+
+
+class RpcMetrics:
+    # one histogram per endpoint and method, updated under a single short lock
+    def __init__(self):
+        self.enabled = True
+        self.started = time()
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def observe(self, endpoint, method, elapsed, timeout=False, error=False):
+        if not self.enabled:
+            return
+        key = endpoint, method
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = MethodStats()
+            if timeout:
+                stats.timeouts += 1
+                return
+            stats.latency.observe(elapsed)
+            if error:
+                stats.errors += 1
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+        self.started = time()
+
+    def _grouped(self, by):
+        grouped = {}
+        with self._lock:
+            for key, stats in self._stats.items():
+                grouped.setdefault(key[by], MethodStats()).merge(stats)
+        return grouped
+
+    def methods(self):
+        return self._grouped(1)
+
+    def endpoints(self):
+        return self._grouped(0)
+
+    def snapshot(self):
+        with self._lock:
+            # per-endpoint buckets would dominate the dump with many clients
+            items = [(key, stats.to_dict(False)) for key, stats in self._stats.items()]
+        endpoints = {}
+        for (endpoint, method), stats in items:
+            endpoints.setdefault(endpoint, {})[method] = stats
+        return {
+            "elapsed": time() - self.started,
+            "methods": {
+                method: stats.to_dict() for method, stats in self.methods().items()
+            },
+            "endpoints": endpoints,
+        }
+
+    def dump(self, path):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.snapshot(), f, indent=2)
+        os.replace(tmp_path, path)
+
+    def report(self, slowest=5):
+        elapsed = max(time() - self.started, 1e-6)
+        lines = []
+        for method, stats in sorted(self.methods().items()):
+            latency = stats.latency
+            lines.append(
+                f"{method}: {latency.count} calls ({latency.count / elapsed:.1f}/s), "
+                f"p50 {latency.quantile(0.5) * 1000:.0f} ms, "
+                f"p95 {latency.quantile(0.95) * 1000:.0f} ms, "
+                f"p99 {latency.quantile(0.99) * 1000:.0f} ms, "
+                f"max {latency.max * 1000:.0f} ms, "
+                f"{stats.timeouts} timeouts, {stats.errors} errors"
+            )
+        ranked = sorted(
+            self.endpoints().items(),
+            key=lambda item: item[1].latency.quantile(0.95),
+            reverse=True,
+        )[:slowest]
+        if ranked:
+            lines.append(
+                "slowest endpoints (p95): "
+                + ", ".join(
+                    f"{endpoint} {stats.latency.quantile(0.95) * 1000:.0f} ms"
+                    for endpoint, stats in ranked
+                )
+            )
+        return lines
+
+
+class PeriodicDump:
+    def __init__(self, metrics, path, interval=60):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.metrics.dump(self.path)
+            except Exception:
+                pass
+
+    def start(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.metrics.dump(self.path)
@@ -0,0 +1,58 @@
+import threading
+
+
+class CoinjoinScheduler:
+    def __init__(self, reconcile_interval=60):
+        self.reconcile_interval = reconcile_interval
+        self.states = {}
+        self.ticks = 0
+        self.sent = 0
+        self.skipped = 0
+        self.last_sent = 0
+        self.last_skipped = 0
+        self._lock = threading.Lock()
+
+    def plan(self, clients, condition):
+        self.ticks += 1
+        reconcile = (
+            self.reconcile_interval > 0 and self.ticks % self.reconcile_interval == 0
+        )
+        if reconcile:
+            # known states may have drifted (restarted daemon, new coins for v1)
+            with self._lock:
+                self.states.clear()
+
+        start, stop = [], []
+        for client in clients:
+            mixing = condition(client)
+            if not client.stateless_coinjoin and self.states.get(client.name) is mixing:
+                continue
+            (start if mixing else stop).append(client)
+
+        self.last_sent = len(start) + len(stop)
+        self.last_skipped = len(clients) - self.last_sent
+        self.sent += self.last_sent
+        self.skipped += self.last_skipped
+        return start, stop
+
+    def forget(self, client):
+        with self._lock:
+            self.states.pop(client.name, None)
+
+    def record(self, client, mixing, result):
+        if str(result) == "timeout":
+            return
+        with self._lock:
+            self.states[client.name] = mixing
+
+    def is_mixing(self, client):
+        return self.states.get(client.name)
+
+    def summary(self):
+        total = self.sent + self.skipped
+        saved = self.skipped / self.ticks if self.ticks else 0
+        ratio = self.skipped / total * 100 if total else 0
+        return (
+            f"sent {self.sent} coinjoin RPCs, skipped {self.skipped} "
+            f"({ratio:.1f}%, {saved:.1f} per tick)"
+        )
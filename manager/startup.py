@@ -0,0 +1,111 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import sleep, time
+from manager.utils import backoff, percentile
+
+WINDOW = 8
+MAX_WINDOW = 64
+RETRIES = 3
+ADAPT_INTERVAL = 5
+HIGH_LOAD = 1.5
+LOW_LOAD = 0.75
+
+
+class StartupScheduler:
+    # admits at most `window` concurrent starts, retries each item on its own
+    def __init__(
+        self,
+        start,
+        cleanup=None,
+        window=WINDOW,
+        max_window=MAX_WINDOW,
+        adaptive=False,
+        retries=RETRIES,
+    ):
+        self.start = start
+        self.cleanup = cleanup
+        self.window = window
+        self.max_window = max(window, max_window) if adaptive else window
+        self.adaptive = adaptive
+        self.retries = retries
+        self.active = 0
+        self.attempts = 0
+        self.failures = 0
+        self.ready_times = []
+        self.elapsed = 0.0
+        self._condition = threading.Condition()
+        self._last_adapt = time()
+
+    def _adapt(self):
+        # additive increase while the host has spare CPU, halve under load
+        now = time()
+        if now - self._last_adapt < ADAPT_INTERVAL:
+            return
+        self._last_adapt = now
+        load = os.getloadavg()[0] / (os.cpu_count() or 1)
+        if load > HIGH_LOAD:
+            self.window = max(1, self.window // 2)
+        elif load < LOW_LOAD:
+            self.window = min(self.max_window, self.window + 1)
+
+    def _acquire(self):
+        with self._condition:
+            while True:
+                if self.adaptive:
+                    self._adapt()
+                if self.active < self.window:
+                    self.active += 1
+                    self.attempts += 1
+                    return
+                self._condition.wait(ADAPT_INTERVAL if self.adaptive else None)
+
+    def _release(self):
+        with self._condition:
+            self.active -= 1
+            self._condition.notify()
+
+    def _run(self, item):
+        start = time()
+        delays = backoff(initial=5, maximum=60)
+        for attempt in range(self.retries + 1):
+            self._acquire()
+            try:
+                result = self.start(*item)
+            except Exception:
+                result = None
+            finally:
+                self._release()
+            if result is not None:
+                with self._condition:
+                    self.ready_times.append(time() - start)
+                return result
+            with self._condition:
+                self.failures += 1
+            if self.cleanup is not None:
+                try:
+                    self.cleanup(*item)
+                except Exception:
+                    pass
+            if attempt < self.retries:
+                sleep(next(delays))
+        return None
+
+    def run(self, items):
+        start = time()
+        with ThreadPoolExecutor(
+            max_workers=max(1, min(len(items), self.max_window * 4)),
+            thread_name_prefix="startup",
+        ) as executor:
+            results = list(executor.map(self._run, items))
+        self.elapsed = time() - start
+        return results
+
+    def report(self, started):
+        rate = started / self.elapsed * 60 if self.elapsed else 0.0
+        return (
+            f"{rate:.1f} clients/min, time to ready "
+            f"p50 {percentile(self.ready_times, 50):.1f} seconds, "
+            f"p95 {percentile(self.ready_times, 95):.1f} seconds, "
+            f"{self.attempts} attempts, {self.failures} failed"
+        )
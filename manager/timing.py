@@ -0,0 +1,162 @@
+import bisect
+import contextlib
+import json
+import threading
+from time import time
+
+_spans = []
+_lock = threading.Lock()
+_phase = None
+_started = time()
+
+
+def reset():
+    global _phase, _started
+    with _lock:
+        _spans.clear()
+    _phase = None
+    _started = time()
+
+
+def record(name, category, start, end=None, **attrs):
+    # spans are attributed to the phase running when they are recorded
+    span = {
+        "name": name,
+        "category": category,
+        "phase": _phase,
+        "start": start,
+        "end": end,
+        **attrs,
+    }
+    with _lock:
+        _spans.append(span)
+    return span
+
+
+@contextlib.contextmanager
+def span(name, category="step", **attrs):
+    entry = record(name, category, time(), **attrs)
+    try:
+        yield entry
+    finally:
+        entry["end"] = time()
+
+
+@contextlib.contextmanager
+def phase(name):
+    global _phase
+    _phase = name
+    try:
+        with span(name, "phase") as entry:
+            yield entry
+    finally:
+        _phase = None
+
+
+def duration(span, now=None):
+    end = span["end"] if span["end"] is not None else (now or time())
+    return end - span["start"]
+
+
+def spans(category=None):
+    with _lock:
+        return [s for s in _spans if category is None or s["category"] == category]
+
+
+def phases():
+    return {s["name"]: duration(s) for s in spans("phase")}
+
+
+def longest_chain(steps, now):
+    # the sequence of non-overlapping steps with the largest total duration
+    steps = sorted(steps, key=lambda s: s["end"] or now)
+    ends = [s["end"] or now for s in steps]
+    best = [(0.0, None)]
+    for idx, s in enumerate(steps):
+        previous = bisect.bisect_right(ends, s["start"], hi=idx)
+        chained = best[previous][0] + duration(s, now)
+        # on ties the chain ending later wins, it is the one bounding the phase
+        if chained >= best[idx][0]:
+            best.append((chained, (idx, previous)))
+        else:
+            best.append(best[idx])
+    chain = []
+    link = best[-1][1]
+    while link is not None:
+        idx, previous = link
+        chain.append(steps[idx])
+        link = best[previous][1]
+    return chain[::-1]
+
+
+def critical_path(slack=0.05):
+    # phases run one after another, within a phase the longest chain of steps
+    now = time()
+    children = {}
+    for s in spans():
+        if s["category"] != "phase" and s["phase"] is not None:
+            children.setdefault(s["phase"], []).append(s)
+    path = []
+    for p in spans("phase"):
+        chain = longest_chain(children.get(p["name"], []), now)
+        # a phase waiting on something else, e.g. rounds, has no critical chain
+        if chain:
+            gap = (p["end"] or now) - (chain[-1]["end"] or now)
+            if gap > slack * duration(p, now):
+                chain = []
+        path.append((p, chain))
+    return path
+
+
+def format_chain(chain, steps=3):
+    if len(chain) <= steps:
+        return " > ".join(f"{s['name']} {duration(s):.1f} s" for s in chain)
+    longest = max(chain, key=duration)
+    total = sum(map(duration, chain))
+    return (
+        f"{len(chain)} steps {total:.1f} s, "
+        f"longest {longest['name']} {duration(longest):.1f} s"
+    )
+
+
+def dump(path):
+    now = time()
+    with open(path, "w") as f:
+        json.dump(
+            {
+                "started": _started,
+                "spans": [
+                    {
+                        **s,
+                        "start": s["start"] - _started,
+                        "end": (s["end"] or now) - _started,
+                        "duration": duration(s, now),
+                    }
+                    for s in spans()
+                ],
+            },
+            f,
+            indent=2,
+        )
+
+
+def summary(slowest=5):
+    lines = []
+    total = sum(phases().values())
+    for name, seconds in phases().items():
+        share = seconds / total * 100 if total else 0.0
+        lines.append(f"{name:<24}{seconds:>10.1f} s{share:>7.1f} %")
+    path = [
+        f"{p['name']} ({format_chain(chain)})" if chain else p["name"]
+        for p, chain in critical_path()
+        if duration(p) >= 0.1
+    ]
+    lines.append(f"critical path: {' > '.join(path)}")
+    for category in ("startup", "payment", "logs"):
+        ranked = sorted(spans(category), key=duration, reverse=True)[:slowest]
+        if ranked:
+            lines.append(
+                f"slowest {category}: "
+                + ", ".join(f"{s['name']} {duration(s):.1f} s" for s in ranked)
+            )
+    return lines
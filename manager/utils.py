@@ -1,4 +1,73 @@
+import io
+import random
+import resource
+import tarfile
+
+
+def backoff(initial=0.1, maximum=5.0, factor=2.0, jitter=0.5):
+    # jittered exponential delays keep many waiters from polling in lockstep
+    delay = initial
+    while True:
+        yield delay * (1 - jitter * random.random())
+        delay = min(maximum, delay * factor)
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q / 100))]
+
+
+def raise_nofile_limit():
+    # every simulated client holds sockets, the default soft limit is too low
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    return hard
+
+
 def batched(data, batch_size=1):
     length = len(data)
     for ndx in range(0, length, batch_size):
         yield data[ndx : min(ndx + batch_size, length)]
+
+
+class IterStream(io.RawIOBase):
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.leftover = b""
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        try:
+            chunk = self.leftover or next(self.chunks)
+        except StopIteration:
+            return 0
+        output, self.leftover = chunk[: len(buffer)], chunk[len(buffer) :]
+        buffer[: len(output)] = output
+        self.bytes_read += len(output)
+        return len(output)
+
+
+def extract_stream(chunks, dst_path, mode="r|"):
+    stream = IterStream(chunks)
+    with tarfile.open(fileobj=stream, mode=mode) as tar:
+        tar.extractall(dst_path)
+    return stream.bytes_read
+
+
+def read_stream_file(chunks, name, mode="r|"):
+    with tarfile.open(fileobj=IterStream(chunks), mode=mode) as tar:
+        for member in tar:
+            if member.name == name:
+                return tar.extractfile(member).read()
+    raise FileNotFoundError(name)
+
+
+def format_transfer(size, elapsed):
+    rate = size / max(elapsed, 1e-6)
+    return f"{size / 2**20:.2f} MiB in {elapsed:.2f} s, {rate / 2**20:.2f} MiB/s"
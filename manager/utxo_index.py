@@ -0,0 +1,90 @@
+import bisect
+import threading
+
+
+def coin_key(coin):
+    return coin["txid"], coin["index"]
+
+
+def coin_keys(coins):
+    # keys of coins as passed to send
+    return [(coin["transactionid"], coin["index"]) for coin in coins]
+
+
+class UtxoIndex:
+    # client-side view of a wallet's unspent coins, sorted by amount
+    def __init__(self, client):
+        self.client = client
+        self.coins = {}
+        self.available = []
+        self.reserved = set()
+        self.spent = set()
+        self.refreshes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.available)
+
+    def refresh(self):
+        unspent_coins = self.client.list_unspent_coins()
+        if str(unspent_coins) == "timeout":
+            return False
+        listed = {coin_key(coin): coin for coin in unspent_coins}
+        with self._lock:
+            for key in self.coins.keys() - listed.keys():
+                self._discard(key)
+            # spends stay excluded until the wallet stops listing them
+            self.spent &= listed.keys()
+            for key in listed.keys() - self.coins.keys() - self.spent:
+                self.coins[key] = listed[key]["amount"]
+                bisect.insort(self.available, (self.coins[key], key))
+            self.refreshes += 1
+        return True
+
+    def _discard(self, key):
+        amount = self.coins.pop(key)
+        self.reserved.discard(key)
+        idx = bisect.bisect_left(self.available, (amount, key))
+        if idx < len(self.available) and self.available[idx] == (amount, key):
+            del self.available[idx]
+
+    def select(self, cost, exclude=()):
+        # the smallest coin exceeding the cost, otherwise the largest coins
+        with self._lock:
+            idx = bisect.bisect_right(self.available, cost, key=lambda entry: entry[0])
+            while idx < len(self.available) and self.available[idx][1] in exclude:
+                idx += 1
+            if idx < len(self.available):
+                selected = [self.available[idx]]
+            else:
+                selected = []
+                for entry in reversed(self.available):
+                    if cost < 0:
+                        break
+                    if entry[1] not in exclude:
+                        selected.append(entry)
+                        cost -= entry[0]
+                if cost >= 0:
+                    return None
+            for entry in selected:
+                del self.available[bisect.bisect_left(self.available, entry)]
+            keys = [key for _, key in selected]
+            self.reserved.update(keys)
+        return [{"transactionid": txid, "index": index} for txid, index in keys]
+
+    def release(self, coins):
+        with self._lock:
+            for coin in coins:
+                key = coin["transactionid"], coin["index"]
+                if key in self.reserved:
+                    self.reserved.remove(key)
+                    bisect.insort(self.available, (self.coins[key], key))
+
+    def spend(self, coins):
+        with self._lock:
+            for coin in coins:
+                key = coin["transactionid"], coin["index"]
+                if key in self.coins:
+                    self.reserved.discard(key)
+                    self.coins.pop(key)
+                self.spent.add(key)
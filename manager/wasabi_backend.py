@@ -1,6 +1,7 @@
-import json
 import requests
 from time import sleep
+from manager import rpc
+from manager.utils import backoff
 
 WALLET_NAME = "wallet"
 
@@ -12,37 +13,30 @@ class WasabiBackend:
         self.internal_ip = internal_ip
         self.proxy = proxy
 
+    def _endpoint(self):
+        return rpc.endpoint(self.host, self.port, self.proxy, name="wasabi-backend")
+
     def _rpc(self, request):
         request["jsonrpc"] = "2.0"
         request["id"] = "1"
         try:
-            response = requests.post(
-                f"http://{self.host}:{self.port}/{WALLET_NAME}",
-                data=json.dumps(request),
-                proxies=dict(http=self.proxy),
-                timeout=5,
-            )
+            response = self._endpoint().post(request, path=WALLET_NAME, timeout=5)
         except requests.exceptions.Timeout:
             return "timeout"
-        if "error" in response.json():
-            raise Exception(response.json()["error"])
-        if "result" in response.json():
-            return response.json()["result"]
+        if "error" in response:
+            raise Exception(response["error"])
+        if "result" in response:
+            return response["result"]
         return None
 
     def _get_status(self):
-        response = requests.get(
-            f"http://{self.host}:{self.port}/api/v4/btc/Blockchain/status",
-            proxies=dict(http=self.proxy),
-            timeout=5,
-        )
-        return response.json()
+        return self._endpoint().get("api/v4/btc/Blockchain/status", timeout=5)
 
     def wait_ready(self):
-        while True:
+        for delay in backoff():
             try:
                 self._get_status()
                 break
             except:
                 pass
-            sleep(0.1)
+            sleep(delay)
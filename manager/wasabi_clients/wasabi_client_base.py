@@ -1,12 +1,15 @@
-import json
 import random
 import requests
 from time import sleep, time
+from manager import rpc
+from manager.utils import backoff
 
 WALLET_NAME = "wallet"
 
 
 class WasabiClientBase:
+    stateless_coinjoin = False
+
     def __init__(
         self,
         host="localhost",
@@ -16,6 +19,8 @@ class WasabiClientBase:
         version="2.0.4",
         delay=(0, 0),
         stop=(0, 0),
+        wallet_name=WALLET_NAME,
+        container=None,
     ):
         self.host = host
         self.port = port
@@ -24,6 +29,8 @@ class WasabiClientBase:
         self.version = version
         self.delay = delay
         self.stop = stop
+        self.wallet_name = wallet_name
+        self.container = container or name
 
     def _rpc(self, request, wallet=True, timeout=5, repeat=1):
         request["jsonrpc"] = "2.0"
@@ -32,20 +39,18 @@ class WasabiClientBase:
         if self.version < "2.0.4":
             wallet = False
 
+        endpoint = rpc.endpoint(self.host, self.port, self.proxy, name=self.container)
         for _ in range(repeat):
             try:
-                response = requests.post(
-                    f"http://{self.host}:{self.port}/{WALLET_NAME if wallet else ''}",
-                    data=json.dumps(request),
-                    proxies=dict(http=self.proxy),
-                    timeout=timeout,
+                response = endpoint.post(
+                    request, path=self.wallet_name if wallet else "", timeout=timeout
                 )
             except requests.exceptions.Timeout:
                 continue
-            if "error" in response.json():
-                raise Exception(response.json()["error"])
-            if "result" in response.json():
-                return response.json()["result"]
+            if "error" in response:
+                raise Exception(response["error"])
+            if "result" in response:
+                return response["result"]
             return None
         return "timeout"
 
@@ -58,7 +63,7 @@ class WasabiClientBase:
     def _create_wallet(self):
         request = {
             "method": "createwallet",
-            "params": [WALLET_NAME, ""],
+            "params": [self.wallet_name, ""],
         }
         return self._rpc(request)
 
@@ -69,6 +74,9 @@ class WasabiClientBase:
         }
         return self._rpc(request)["address"]
 
+    def get_new_addresses(self, count):
+        return list(rpc.executor().map(lambda _: self.get_new_address(), range(count)))
+
     def get_balance(self, timeout=None):
         request = {
             "method": "getwalletinfo",
@@ -77,6 +85,7 @@ class WasabiClientBase:
 
     def wait_wallet(self, timeout=None):
         start = time()
+        delays = backoff()
         while timeout is None or time() - start < timeout:
             try:
                 self._create_wallet()
@@ -89,28 +98,30 @@ class WasabiClientBase:
             except:
                 pass
 
-            sleep(0.1)
+            sleep(next(delays))
         return False
 
-    def _list_unspent_coins(self):
-        request = {
-            "method": "listunspentcoins",
-        }
-        return self._rpc(request)
-
-    def send(self, invoices):
+    def _select_coins(self, cost):
         unspent_coins = self._list_unspent_coins()
         random.shuffle(unspent_coins)
 
-        cost = sum(map(lambda x: x[1], invoices))
         coins = []
         for coin in unspent_coins:
             coins.append({"transactionid": coin["txid"], "index": coin["index"]})
             cost -= coin["amount"]
             if cost < 0:
-                break
-        else:
-            raise Exception("Not enough BTC")
+                return coins
+        raise Exception("Not enough BTC")
+
+    def _list_unspent_coins(self):
+        request = {
+            "method": "listunspentcoins",
+        }
+        return self._rpc(request)
+
+    def send(self, invoices, coins=None):
+        if coins is None:
+            coins = self._select_coins(sum(map(lambda x: x[1], invoices)))
 
         payments = list(map(lambda x: {"sendto": x[0], "amount": x[1]}, invoices))
 
@@ -157,10 +168,40 @@ class WasabiClientBase:
         return self._rpc(request, timeout=10, repeat=3)
 
     def wait_ready(self):
-        while True:
+        for delay in backoff():
             try:
                 self.get_status()
                 break
             except:
                 pass
-            sleep(0.1)
+            sleep(delay)
+
+    async def get_status_async(self):
+        return await rpc.run_async(self.get_status)
+
+    async def get_new_address_async(self):
+        return await rpc.run_async(self.get_new_address)
+
+    async def get_balance_async(self, timeout=None):
+        return await rpc.run_async(self.get_balance, timeout=timeout)
+
+    async def wait_wallet_async(self, timeout=None):
+        return await rpc.run_async(self.wait_wallet, timeout=timeout)
+
+    async def send_async(self, invoices, coins=None):
+        return await rpc.run_async(self.send, invoices, coins)
+
+    async def start_coinjoin_async(self):
+        return await rpc.run_async(self.start_coinjoin)
+
+    async def stop_coinjoin_async(self):
+        return await rpc.run_async(self.stop_coinjoin)
+
+    async def list_coins_async(self):
+        return await rpc.run_async(self.list_coins)
+
+    async def list_unspent_coins_async(self):
+        return await rpc.run_async(self.list_unspent_coins)
+
+    async def list_keys_async(self):
+        return await rpc.run_async(self.list_keys)
@@ -1,8 +1,11 @@
 from .wasabi_client_base import WasabiClientBase, WALLET_NAME
 from time import sleep, time
+from manager.utils import backoff
 
 
 class WasabiClientV1(WasabiClientBase):
+    # coins are enqueued explicitly, so newly received coins need a new start
+    stateless_coinjoin = True
 
     def __init__(
         self,
@@ -13,15 +16,20 @@ class WasabiClientV1(WasabiClientBase):
         version="1.1.12.9",
         delay=(0, 0),
         stop=(0, 0),
+        wallet_name=WALLET_NAME,
+        container=None,
     ):
-        super().__init__(host, port, name, proxy, version, delay, stop)
+        super().__init__(
+            host, port, name, proxy, version, delay, stop, wallet_name, container
+        )
 
     def select(self, timeout=5, repeat=10):
-        request = {"method": "selectwallet", "params": [WALLET_NAME]}
+        request = {"method": "selectwallet", "params": [self.wallet_name]}
         self._rpc(request, False, timeout=timeout, repeat=repeat)
 
     def wait_wallet(self, timeout=None):
         start = time()
+        delays = backoff()
         while timeout is None or time() - start < timeout:
             try:
                 self._create_wallet()
@@ -35,7 +43,7 @@ class WasabiClientV1(WasabiClientBase):
             except:
                 pass
 
-            sleep(0.1)
+            sleep(next(delays))
         return False
 
     def list_coins(self):
@@ -1,5 +1,6 @@
 from .wasabi_client_base import WasabiClientBase, WALLET_NAME
 from time import sleep, time
+from manager.utils import backoff
 
 
 class WasabiClientV2(WasabiClientBase):
@@ -13,15 +14,20 @@ class WasabiClientV2(WasabiClientBase):
         version="2.0.3",
         delay=(0, 0),
         stop=(0, 0),
+        wallet_name=WALLET_NAME,
+        container=None,
     ):
-        super().__init__(host, port, name, proxy, version, delay, stop)
+        super().__init__(
+            host, port, name, proxy, version, delay, stop, wallet_name, container
+        )
 
     def select(self, timeout=5, repeat=10):
-        request = {"method": "selectwallet", "params": [WALLET_NAME]}
+        request = {"method": "selectwallet", "params": [self.wallet_name]}
         self._rpc(request, False, timeout=timeout, repeat=repeat)
 
     def wait_wallet(self, timeout=None):
         start = time()
+        delays = backoff()
         while timeout is None or time() - start < timeout:
             try:
                 self._create_wallet()
@@ -35,5 +41,5 @@ class WasabiClientV2(WasabiClientBase):
             except:
                 pass
 
-            sleep(0.1)
+            sleep(next(delays))
         return False
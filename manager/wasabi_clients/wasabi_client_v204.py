@@ -1,4 +1,4 @@
-from .wasabi_client_base import WasabiClientBase
+from .wasabi_client_base import WasabiClientBase, WALLET_NAME
 
 
 class WasabiClientV204(WasabiClientBase):
@@ -12,5 +12,9 @@ class WasabiClientV204(WasabiClientBase):
         version="2.0.4",
         delay=(0, 0),
         stop=(0, 0),
+        wallet_name=WALLET_NAME,
+        container=None,
     ):
-        super().__init__(host, port, name, proxy, version, delay, stop)
+        super().__init__(
+            host, port, name, proxy, version, delay, stop, wallet_name, container
+        )